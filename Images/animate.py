@@ -6,18 +6,253 @@ Make an animated GIF from one or more frames.
 """
 
 import argparse
+import time
+from collections import deque
+from collections.abc import Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
-from PIL import Image
+from PIL import GifImagePlugin, Image, ImageChops
+
+# Frames (and thumbnail size) sampled to build a shared palette
+PALETTE_SAMPLES = 8
+PALETTE_SAMPLE_SIZE = 256
+
+
+def shared_palette(
+    input_paths: list[Path],
+    samples: int = PALETTE_SAMPLES,
+    sample_size: int = PALETTE_SAMPLE_SIZE,
+) -> Image.Image:
+    """
+    Return a palette image adapted to thumbnails of frames sampled across the input.
+
+    The palette has at most 255 colors, leaving an index free for transparency.
+    """
+    step = max(1, len(input_paths) // samples)
+    thumbnails = []
+    for path in input_paths[::step][:samples]:
+        with Image.open(path) as img:
+            img.draft("RGB", (sample_size, sample_size))
+            thumbnail = img.convert("RGB")
+            thumbnail.thumbnail((sample_size, sample_size))
+            thumbnails.append(thumbnail)
+
+    # Stack the thumbnails vertically and quantize them together
+    montage = Image.new(
+        "RGB",
+        (
+            max(thumb.size[0] for thumb in thumbnails),
+            sum(thumb.size[1] for thumb in thumbnails),
+        ),
+    )
+    top = 0
+    for thumbnail in thumbnails:
+        montage.paste(thumbnail, (0, top))
+        top += thumbnail.size[1]
+
+    return montage.quantize(colors=255)
+
+
+def quantize_frame(frame: Image.Image, palette: Image.Image | None) -> Image.Image:
+    """Convert a frame to the given palette, or to its own adaptive palette."""
+    if palette is not None:
+        if frame.mode == "P" and frame.getpalette() == palette.getpalette():
+            return frame
+        return frame.convert("RGB").quantize(palette=palette, dither=Image.Dither.NONE)
+
+    if frame.mode in ("L", "P"):
+        return frame
+    # The adaptive palette can only be built from RGB(A) frames
+    if frame.mode not in ("RGB", "RGBA"):
+        frame = frame.convert("RGBA" if "A" in frame.getbands() else "RGB")
+    return frame.convert("P", palette=Image.Palette.ADAPTIVE)
+
+
+def load_frame(
+    path: Path, max_size: int | None = None, palette: Image.Image | None = None
+) -> Image.Image:
+    """Decode one frame, shrink it to fit within `max_size` and quantize it."""
+    with Image.open(path) as img:
+        if max_size is not None:
+            # Let JPEG frames decode at a reduced scale
+            img.draft("RGB", (max_size, max_size))
+        img.load()
+
+        if max_size is not None and max(img.size) > max_size:
+            if img.mode in ("1", "P"):
+                img = img.convert("RGBA")
+            img.thumbnail((max_size, max_size))
+
+        return quantize_frame(img, palette)
+
+
+def iter_frames(
+    input_paths: Iterable[Path],
+    workers: int = 1,
+    max_size: int | None = None,
+    palette: Image.Image | None = None,
+) -> Iterator[Image.Image]:
+    """
+    Decode, resize and quantize the frames, yielding them in order.
+
+    With more than one worker, frames are prepared in a thread pool, at most
+    two frames per worker ahead of the consumer.
+    """
+    if workers <= 1:
+        for path in input_paths:
+            yield load_frame(path, max_size, palette)
+        return
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for path in input_paths:
+            pending.append(executor.submit(load_frame, path, max_size, palette))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+
+        while pending:
+            yield pending.popleft().result()
+
+
+def crop_unchanged(
+    previous: Image.Image | None, frame: Image.Image, transparency: int
+) -> tuple[Image.Image | None, tuple[int, int]]:
+    """
+    Crop a frame to the region that changed since the previous frame.
+
+    Both frames must use the same palette. Unchanged pixels within the region
+    are set to the `transparency` index. Returns the cropped frame (or None if
+    nothing changed) and its offset.
+    """
+    if previous is None:
+        return frame, (0, 0)
+
+    # The frames share a palette, so palette indices can be compared directly
+    diff = ImageChops.difference(previous, frame)
+    bbox = diff.getbbox()
+    if bbox is None:
+        return None, (0, 0)
+
+    delta = frame.crop(bbox)
+    unchanged = diff.crop(bbox).point(lambda value: 255 if value == 0 else 0, "1")
+    delta.paste(transparency, mask=unchanged)
+    return delta, bbox[:2]
+
+
+def write_animated_gif(
+    frames: Iterable[Image.Image],
+    output_path: Path,
+    duration: int = 500,
+    loop: int = 0,
+    palette: Image.Image | None = None,
+) -> int:
+    """
+    Write frames to an animated GIF as they arrive, returning the frame count.
+
+    Only one frame is held in memory at a time, so `frames` may be a generator.
+
+    If a `palette` image (see `shared_palette`) is given, every frame is mapped
+    to that palette and only the pixels that changed since the previous frame
+    are stored; unchanged frames extend the previous frame's duration.
+    """
+    size = None
+    frame_count = 0
+    previous = None
+    transparency = None
+    # Frames are written one step late so that repeats can extend their duration
+    pending = None
+
+    with output_path.open(mode="wb") as outfile:
+        for frame in frames:
+            if size is None:
+                size = frame.size
+            elif frame.size != size:
+                raise ValueError("Input images must have equal sizes")
+
+            offset = (0, 0)
+            params = {"duration": duration}
+
+            frame = quantize_frame(frame, palette)
+
+            if palette is not None:
+                if frame_count == 0:
+                    # Add an entry for the transparency index after the colors
+                    colors = palette.getpalette()
+                    transparency = len(colors) // 3
+                    frame.putpalette(colors + [0, 0, 0])
+
+                delta, offset = crop_unchanged(previous, frame, transparency)
+                previous = frame
+                if delta is None:
+                    pending[2]["duration"] += duration
+                    continue
+
+                frame = delta
+                # Leave each frame in place so unchanged pixels show through
+                params["disposal"] = 1
+                if frame_count > 0:
+                    params["transparency"] = transparency
+            else:
+                # The first frame's palette is the global color table, every
+                # later frame carries its own local color table
+                params["include_color_table"] = frame_count > 0
+
+            if frame_count == 0:
+                header, _ = GifImagePlugin.getheader(
+                    frame, info={"loop": loop, "duration": duration}
+                )
+                outfile.write(b"".join(header))
+
+            if pending is not None:
+                outfile.write(
+                    b"".join(GifImagePlugin.getdata(*pending[:2], **pending[2]))
+                )
+            pending = (frame, offset, params)
+            frame_count += 1
+
+        if pending is not None:
+            outfile.write(b"".join(GifImagePlugin.getdata(*pending[:2], **pending[2])))
+
+        outfile.write(b";")  # GIF trailer
+
+    return frame_count
 
 
 def create_animated_gif(
-    input_paths: list[Path], output_path: Path, duration: int = 500, loop: int = 0
+    input_paths: list[Path],
+    output_path: Path,
+    duration: int = 500,
+    loop: int = 0,
+    streaming: bool = False,
+    optimize: bool = False,
+    workers: int = 1,
+    max_size: int | None = None,
 ):
-    """Create an animated GIF from two or more image frames."""
+    """
+    Create an animated GIF from two or more image frames.
+
+    If `streaming` is set, the frames are decoded and written one at a time
+    instead of all being held in memory. `optimize` uses one palette for all
+    frames and only stores the pixels that change. `workers` prepares frames in
+    parallel and `max_size` shrinks them to fit within that many pixels. All of
+    these options imply `streaming`.
+    """
     if len(input_paths) < 2:
         raise ValueError("Please supply at least two images.")
 
+    if streaming or optimize or workers > 1 or max_size is not None:
+        start = time.perf_counter()
+        palette = shared_palette(input_paths) if optimize else None
+        frames = iter_frames(input_paths, workers, max_size, palette)
+        write_animated_gif(frames, output_path, duration, loop, palette)
+        elapsed = time.perf_counter() - start
+        print(
+            f"Animated GIF saved to {output_path} "
+            f"({output_path.stat().st_size:,} bytes, encoded in {elapsed:.2f} s)"
+        )
+        return
+
     imgs = [Image.open(path) for path in input_paths]
 
     if len({img.size for img in imgs}) > 1:
@@ -42,17 +277,53 @@ if __name__ == "__main__":
     parser.add_argument("input", type=Path, nargs="+", help="Input image(s)")
     parser.add_argument("--output", type=Path, required=True, help="Output filename")
     parser.add_argument(
-        "--duration", default=500, metavar="ms", help="Delay (in ms) between frames"
+        "--duration",
+        type=int,
+        default=500,
+        metavar="ms",
+        help="Delay (in ms) between frames",
     )
     parser.add_argument(
         "--repeat",
+        type=int,
         default=0,
         metavar="count",
         help="Animation repeat count (0 for unlimited)",
     )
+    parser.add_argument(
+        "--streaming",
+        action="store_true",
+        help="Decode and write one frame at a time to limit memory use",
+    )
+    parser.add_argument(
+        "--optimize",
+        action="store_true",
+        help="Share one palette across frames and only store changed pixels "
+        "(implies --streaming)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        metavar="N",
+        help="Decode frames in N parallel threads (implies --streaming)",
+    )
+    parser.add_argument(
+        "--max-size",
+        type=int,
+        metavar="px",
+        help="Shrink frames to fit within px x px (implies --streaming)",
+    )
 
     args = parser.parse_args()
 
     create_animated_gif(
-        args.input, args.output, duration=args.duration, loop=args.repeat
+        args.input,
+        args.output,
+        duration=args.duration,
+        loop=args.repeat,
+        streaming=args.streaming,
+        optimize=args.optimize,
+        workers=args.workers,
+        max_size=args.max_size,
     )
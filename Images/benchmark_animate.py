@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""Benchmark the time, memory use and output size of animate.py's modes."""
+
+import argparse
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from animate import create_animated_gif
+from PIL import Image, ImageDraw
+
+
+def make_frames(directory: Path, count: int, width: int, height: int) -> list[Path]:
+    """Write `count` frames of a dot moving across a gradient."""
+    background = Image.linear_gradient("L").resize((width, height)).convert("RGB")
+    paths = []
+    for index in range(count):
+        frame = background.copy()
+        x = index * (width - 40) // max(count - 1, 1)
+        ImageDraw.Draw(frame).ellipse((x, height // 2 - 20, x + 40, height // 2 + 20))
+        paths.append(directory / f"frame-{index:05d}.png")
+        frame.save(paths[-1])
+    return paths
+
+
+def measure(mode: str, input_paths: list[Path], output_path: Path):
+    """Create the GIF and print the elapsed time and peak RSS of this process."""
+    start = time.perf_counter()
+    create_animated_gif(
+        input_paths,
+        output_path,
+        streaming=mode == "streaming",
+        optimize=mode == "optimize",
+    )
+    elapsed = time.perf_counter() - start
+
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peak_mb = peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+    print(f"{elapsed:.3f} {peak_mb:.1f}")
+
+
+def benchmark(frame_counts: list[int], width: int, height: int):
+    """Compare the eager, streaming and optimized modes in fresh processes."""
+    print(f"Frame size: {width}x{height}")
+    print(
+        f"{'frames':>8} {'mode':>10} {'time (s)':>10} {'peak RSS (MB)':>14}"
+        f" {'size (KB)':>10}"
+    )
+
+    with tempfile.TemporaryDirectory() as tempdir:
+        paths = make_frames(Path(tempdir), max(frame_counts), width, height)
+
+        for count in frame_counts:
+            for mode in ("eager", "streaming", "optimize"):
+                # Measure each run in its own process so peak RSS isn't shared
+                result = subprocess.run(
+                    [
+                        sys.executable,
+                        __file__,
+                        "--measure",
+                        mode,
+                        Path(tempdir, "out.gif"),
+                        *paths[:count],
+                    ],
+                    capture_output=True,
+                    check=True,
+                    text=True,
+                )
+                elapsed, peak_mb = result.stdout.split()[-2:]
+                size_kb = Path(tempdir, "out.gif").stat().st_size / 2**10
+                print(
+                    f"{count:>8} {mode:>10} {elapsed:>10} {peak_mb:>14}"
+                    f" {size_kb:>10.1f}"
+                )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--frames", type=int, nargs="+", default=[25, 50, 100, 200], metavar="N"
+    )
+    parser.add_argument("--width", type=int, default=800)
+    parser.add_argument("--height", type=int, default=600)
+    parser.add_argument("--measure", nargs="+", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        mode, output, *inputs = args.measure
+        measure(mode, [Path(path) for path in inputs], Path(output))
+    else:
+        benchmark(args.frames, args.width, args.height)
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""Benchmark the compare.py engines on large synthetic images."""
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+from compare import process_images
+from PIL import Image, ImageDraw
+
+
+def make_images(directory: Path, width: int, height: int) -> tuple[Path, Path]:
+    """Write two nearly-identical RGBA images, similar to make_plot.py output."""
+    img = Image.new("RGBA", (width, height), "white")
+    draw = ImageDraw.Draw(img)
+    for index in range(0, width, 40):
+        draw.ellipse((index, index % height, index + 20, index % height + 20), "blue")
+
+    path1 = directory / "first.png"
+    path2 = directory / "second.png"
+    img.save(path1)
+
+    draw.ellipse((width // 2, height // 2, width // 2 + 20, height // 2 + 20), "red")
+    img.save(path2)
+
+    return path1, path2
+
+
+def benchmark(width: int, height: int, engines: list[str]):
+    """Time each engine on the same pair of images."""
+    with tempfile.TemporaryDirectory() as tempdir:
+        path1, path2 = make_images(Path(tempdir), width, height)
+
+        timings = {}
+        outputs = {}
+        for engine in engines:
+            output_path = Path(tempdir, f"diff-{engine}.png")
+            start = time.perf_counter()
+            process_images(path1, path2, output_path, engine=engine)
+            timings[engine] = time.perf_counter() - start
+            outputs[engine] = Image.open(output_path).tobytes()
+
+    print(f"Image size: {width}x{height}")
+    for engine, elapsed in timings.items():
+        print(f"  {engine:>8}: {elapsed:8.3f} s")
+
+    if "python" in timings and "numpy" in timings:
+        print(f"  Speedup: {timings['python'] / timings['numpy']:.1f}x")
+        if outputs["python"] != outputs["numpy"]:
+            print("  WARNING: engine outputs differ!")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--width", type=int, default=2400)
+    parser.add_argument("--height", type=int, default=1800)
+    parser.add_argument(
+        "--engine",
+        dest="engines",
+        action="append",
+        choices=("numpy", "python"),
+        help="Engine to benchmark (may be repeated; default is both)",
+    )
+    args = parser.parse_args()
+
+    benchmark(args.width, args.height, args.engines or ["numpy", "python"])
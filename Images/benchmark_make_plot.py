@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""Benchmark the render time and output size of make_plot.py's dense modes."""
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+from make_plot import DENSE_MODES, make_plot
+
+
+def benchmark(point_counts: list[int], formats: list[str], max_vector_points: int):
+    """Time each dense mode (and plain vector scatter plots) at each point count."""
+    print(
+        f"{'points':>10} {'format':>6} {'mode':>10} {'time (s)':>10} {'size (KB)':>10}"
+    )
+
+    with tempfile.TemporaryDirectory() as tempdir:
+        for count in point_counts:
+            for suffix in formats:
+                for mode in (None, *DENSE_MODES):
+                    if mode is None and count > max_vector_points:
+                        continue
+
+                    output = Path(tempdir, f"plot.{suffix}")
+                    start = time.perf_counter()
+                    make_plot(output, deterministic=True, points=count, dense=mode)
+                    elapsed = time.perf_counter() - start
+                    size_kb = output.stat().st_size / 2**10
+                    print(
+                        f"{count:>10} {suffix:>6} {mode or 'vector':>10}"
+                        f" {elapsed:>10.3f} {size_kb:>10.1f}"
+                    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--points",
+        type=int,
+        nargs="+",
+        default=[1_000, 10_000, 100_000, 1_000_000],
+        metavar="N",
+    )
+    parser.add_argument(
+        "--formats", nargs="+", default=["png", "pdf", "svg"], metavar="EXT"
+    )
+    parser.add_argument(
+        "--max-vector-points",
+        type=int,
+        default=100_000,
+        metavar="N",
+        help="Skip plain vector scatter plots of more points than this",
+    )
+    args = parser.parse_args()
+
+    benchmark(args.points, args.formats, args.max_vector_points)
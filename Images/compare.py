@@ -1,52 +1,504 @@
 #!/usr/bin/env python3
 """Compare two images."""
 
+import contextlib
+import csv
+import hashlib
+import html
+import io
+import json
+import os
+import re
+import struct
 import sys
+import zlib
+from collections.abc import Iterable, Iterator
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
+from string import Template
 
+from image_strips import PNG_SIGNATURE, iter_strips, png_chunk
 from PIL import Image
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+ENGINES = ("auto", "numpy", "python")
+
+# Approximate working-set bytes per pixel for one strip of the streaming mode
+# (the decoding buffers and strips of both inputs, their array copies, the
+# faint blend and the output strip)
+STREAMING_BYTES_PER_PIXEL = 80
+# Additional bytes per pixel for the channel deltas and SSIM blocks in metrics
+METRICS_BYTES_PER_PIXEL = 128
+DEFAULT_STRIP_MEMORY_MB = 256
+DEFAULT_TILE_SIZE = 256
+
+# Pixels per strip when hashing decoded pixels for the identity fast path
+DIGEST_STRIP_PIXELS = 2**18
+
+HTML_REPORT_TEMPLATE = Template("""\
+<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <title>Image Comparison Report</title>
+    <style>
+        table { border-collapse: collapse; }
+        th, td { border: 1px solid #000; padding: 4px 8px; }
+        .pass { background: #dfd; }
+        .fail { background: #fdd; }
+    </style>
+</head>
+<body>
+    <p>$summary</p>
+    <table>
+        <tr>
+            <th>Name</th><th>Result</th><th>Mismatch Fraction</th>
+            <th>Max Delta</th><th>SSIM</th><th>Difference Image</th>
+        </tr>
+$rows
+    </table>
+</body>
+</html>
+""")
+
+# Modes whose channel values can be measured against each other directly
+MEASURED_MODES = ("RGB", "RGBA", "L")
+
+# Block size and stabilizing constants for the block-wise SSIM score
+SSIM_BLOCK_SIZE = 8
+SSIM_C1 = (0.01 * 255) ** 2
+SSIM_C2 = (0.03 * 255) ** 2
+
+
+def strip_digests(path: Path, strip_height: int) -> Iterator[bytes]:
+    """Yield a digest of the decoded pixels in each horizontal strip of an image."""
+    for strip in iter_strips(path, strip_height):
+        digest = hashlib.blake2b(strip.tobytes())
+        if strip.mode == "P":
+            digest.update(bytes(strip.getpalette()))
+        yield digest.digest()
+
+
+def pixels_identical(path1: Path, path2: Path) -> bool:
+    """
+    Return True if two images have the same size, mode and decoded pixels.
+
+    The images are decoded and compared strip-by-strip (see `iter_strips`),
+    stopping at the first mismatch.
+    """
+    with Image.open(path1) as img1, Image.open(path2) as img2:
+        if img1.size != img2.size or img1.mode != img2.mode:
+            return False
+        strip_height = max(1, DIGEST_STRIP_PIXELS // img1.width)
+
+    return all(
+        digest1 == digest2
+        for digest1, digest2 in zip(
+            strip_digests(path1, strip_height), strip_digests(path2, strip_height)
+        )
+    )
+
+
+def compare_python(img1: Image.Image, img2: Image.Image) -> tuple[Image.Image, bool]:
+    """Compare two images pixel-by-pixel in pure Python."""
+    # Create a new image for the output
+    output_img = Image.new("RGB", img1.size)
+
+    # Process each pixel
+    pixels1 = img1.load()
+    pixels2 = img2.load()
+    output_pixels = output_img.load()
+
+    identical = True
+
+    for y in range(img1.size[1]):
+        for x in range(img1.size[0]):
+            pixel1 = pixels1[x, y]
+            pixel2 = pixels2[x, y]
+
+            # If the pixels match, use a faint version of the inputs
+            if pixel1 == pixel2:
+                faint_pixel = tuple(
+                    int((value + 255 + 255) / 3) for value in pixel1[:3]
+                )
+                output_pixels[x, y] = faint_pixel
+            else:
+                # If the pixels do not match, set the pixel to red
+                output_pixels[x, y] = (255, 0, 0)
+                identical = False
+
+    return output_img, identical
+
+
+def diff_arrays(
+    img1: Image.Image, img2: Image.Image, tolerance: int = 0, stats: dict | None = None
+) -> tuple["np.ndarray", "np.ndarray"]:
+    """
+    Return the RGB difference array and the per-pixel match mask.
+
+    Pixels match if no channel differs by more than `tolerance`. If `stats` is
+    given, the difference metrics for these pixels are added to it.
+    """
+    if tolerance or stats is not None:
+        convert = img1.mode != img2.mode or img1.mode not in MEASURED_MODES
+    else:
+        convert = img1.mode == img2.mode == "P"
+    if convert:
+        # Compare colors in a common color space, rather than palette indices
+        # or other encodings
+        alpha = img1.has_transparency_data or img2.has_transparency_data
+        mode = "RGBA" if alpha else "RGB"
+        img1, img2 = img1.convert(mode), img2.convert(mode)
+
+    pixels1 = np.asarray(img1)
+    pixels2 = np.asarray(img2)
+
+    # Images with different modes can never have matching pixels
+    if pixels1.shape != pixels2.shape:
+        matches = np.zeros(pixels1.shape[:2], dtype=bool)
+    elif tolerance or stats is not None:
+        delta = np.abs(pixels1.astype(np.int16) - pixels2)
+        matches = delta <= tolerance
+        if matches.ndim == 3:
+            matches = matches.all(axis=2)
+        if stats is not None:
+            accumulate_metrics(stats, pixels1, pixels2, delta, matches)
+    else:
+        matches = pixels1 == pixels2
+        if matches.ndim == 3:
+            matches = matches.all(axis=2)
+
+    # Matching pixels get a faint version of the inputs, the rest are red
+    rgb = np.asarray(img1.convert("RGB"), dtype=np.uint16)
+    faint = ((rgb + 255 + 255) // 3).astype(np.uint8)
+    output = np.where(matches[..., np.newaxis], faint, np.uint8([255, 0, 0]))
+
+    return output, matches
+
+
+def block_ssim(pixels1: "np.ndarray", pixels2: "np.ndarray") -> "np.ndarray":
+    """Return the SSIM score of each full block of the luminance of two arrays."""
+    if pixels1.ndim == 3:
+        weights = np.array([0.299, 0.587, 0.114])
+        lum1 = pixels1[..., :3] @ weights if pixels1.shape[2] >= 3 else pixels1[..., 0]
+        lum2 = pixels2[..., :3] @ weights if pixels2.shape[2] >= 3 else pixels2[..., 0]
+    else:
+        lum1, lum2 = pixels1, pixels2
+
+    # Reshape into (block row, block column, block pixels), dropping partial blocks
+    rows = lum1.shape[0] // SSIM_BLOCK_SIZE
+    cols = lum1.shape[1] // SSIM_BLOCK_SIZE
+    blocks = []
+    for lum in (lum1, lum2):
+        cropped = lum[: rows * SSIM_BLOCK_SIZE, : cols * SSIM_BLOCK_SIZE]
+        cropped = cropped.reshape(rows, SSIM_BLOCK_SIZE, cols, SSIM_BLOCK_SIZE)
+        blocks.append(
+            cropped.swapaxes(1, 2)
+            .reshape(rows, cols, SSIM_BLOCK_SIZE**2)
+            .astype(np.float64)
+        )
+    blocks1, blocks2 = blocks
+
+    mean1 = blocks1.mean(axis=2)
+    mean2 = blocks2.mean(axis=2)
+    var1 = blocks1.var(axis=2)
+    var2 = blocks2.var(axis=2)
+    covar = (blocks1 * blocks2).mean(axis=2) - mean1 * mean2
+
+    return ((2 * mean1 * mean2 + SSIM_C1) * (2 * covar + SSIM_C2)) / (
+        (mean1**2 + mean2**2 + SSIM_C1) * (var1 + var2 + SSIM_C2)
+    )
+
+
+def accumulate_metrics(
+    stats: dict,
+    pixels1: "np.ndarray",
+    pixels2: "np.ndarray",
+    delta: "np.ndarray",
+    matches: "np.ndarray",
+):
+    """Add the differences in one strip of pixels to the running metrics."""
+    top = stats.get("rows", 0)
+    stats["rows"] = top + matches.shape[0]
+    stats["pixels"] = stats.get("pixels", 0) + matches.size
+    stats["values"] = stats.get("values", 0) + delta.size
+    stats["mismatched_pixels"] = stats.get("mismatched_pixels", 0) + int(
+        matches.size - np.count_nonzero(matches)
+    )
+    stats["max_delta"] = max(stats.get("max_delta", 0), int(delta.max(initial=0)))
+    stats["sum_squared"] = stats.get("sum_squared", 0) + int(
+        np.square(delta, dtype=np.int64).sum()
+    )
+
+    ssim = block_ssim(pixels1, pixels2)
+    stats["ssim_sum"] = stats.get("ssim_sum", 0.0) + float(ssim.sum())
+    stats["ssim_blocks"] = stats.get("ssim_blocks", 0) + ssim.size
+
+    rows, cols = np.nonzero(~matches)
+    if rows.size:
+        box = [
+            int(cols.min()),
+            top + int(rows.min()),
+            int(cols.max()) + 1,
+            top + int(rows.max()) + 1,
+        ]
+        if old_box := stats.get("bbox"):
+            box = [*map(min, old_box[:2], box[:2]), *map(max, old_box[2:], box[2:])]
+        stats["bbox"] = box
 
-def process_images(input_path1: Path, input_path2: Path, output_path: Path) -> bool:
-    """Compare two images, generating a difference image and returning True if they match."""
-    try:
-        # Load the images
-        img1 = Image.open(input_path1)
-        img2 = Image.open(input_path2)
 
+def summarize_metrics(stats: dict) -> dict:
+    """Turn accumulated statistics into the reported difference metrics."""
+    pixels = stats.get("pixels", 0)
+    mismatched = stats.get("mismatched_pixels", 0)
+    values = stats.get("values", 0)
+    blocks = stats.get("ssim_blocks", 0)
+
+    return {
+        "pixels": pixels,
+        "mismatched_pixels": mismatched,
+        "mismatch_fraction": mismatched / pixels if pixels else 0.0,
+        "max_delta": stats.get("max_delta", 0),
+        "rmse": (stats.get("sum_squared", 0) / values) ** 0.5 if values else 0.0,
+        "ssim": stats["ssim_sum"] / blocks if blocks else 1.0,
+        "bbox": stats.get("bbox"),
+    }
+
+
+def compare_numpy(
+    img1: Image.Image, img2: Image.Image, tolerance: int = 0, stats: dict | None = None
+) -> tuple[Image.Image, bool]:
+    """Compare two images with whole-array NumPy operations."""
+    output, matches = diff_arrays(img1, img2, tolerance, stats)
+    return Image.fromarray(output), bool(matches.all())
+
+
+def write_png_strips(
+    output_path: Path, size: tuple[int, int], strips: Iterable["np.ndarray"]
+):
+    """Write horizontal strips of RGB pixels to a PNG file as they are produced."""
+    width, height = size
+    compressor = zlib.compressobj()
+
+    with output_path.open(mode="wb") as outfile:
+        outfile.write(PNG_SIGNATURE)
+        # 8-bit RGB, default compression/filter methods, no interlacing
+        outfile.write(
+            png_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+        )
+
+        for strip in strips:
+            # Use the "Sub" filter (type 1) on every row: store each byte as the
+            # difference from the same channel of the pixel to its left
+            rows = np.empty((strip.shape[0], 1 + width * 3), dtype=np.uint8)
+            rows[:, 0] = 1
+            filtered = rows[:, 1:].reshape(strip.shape)
+            filtered[:, 0] = strip[:, 0]
+            np.subtract(strip[:, 1:], strip[:, :-1], out=filtered[:, 1:])
+
+            if data := compressor.compress(rows.tobytes()):
+                outfile.write(png_chunk(b"IDAT", data))
+
+        outfile.write(png_chunk(b"IDAT", compressor.flush()))
+        outfile.write(png_chunk(b"IEND", b""))
+
+
+def count_tile_mismatches(
+    mismatches: "np.ndarray", top: int, tile_size: int, tile_counts: dict
+):
+    """Add the mismatches in one strip to the running per-tile counts."""
+    col_starts = np.arange(0, mismatches.shape[1], tile_size)
+    rows = top + np.arange(mismatches.shape[0])
+    row_starts = np.flatnonzero(np.diff(rows // tile_size, prepend=-1))
+
+    per_row = np.add.reduceat(mismatches, col_starts, axis=1, dtype=np.int64)
+    per_tile = np.add.reduceat(per_row, row_starts, axis=0)
+
+    for row_index, col_index in zip(*np.nonzero(per_tile)):
+        tile_top = rows[row_starts[row_index]] // tile_size * tile_size
+        tile_left = int(col_starts[col_index])
+        key = (tile_left, int(tile_top))
+        tile_counts[key] = tile_counts.get(key, 0) + int(per_tile[row_index, col_index])
+
+
+def compare_streaming(
+    input_path1: Path,
+    input_path2: Path,
+    output_path: Path | None,
+    strip_memory: int = DEFAULT_STRIP_MEMORY_MB * 2**20,
+    tile_size: int = DEFAULT_TILE_SIZE,
+    tolerance: int = 0,
+    stats: dict | None = None,
+) -> dict[tuple[int, int, int, int], int]:
+    """
+    Compare two images strip-by-strip, writing the difference image as it goes.
+
+    The strip height is chosen so that each strip's working set, including
+    decoding the inputs (see `iter_strips`), is about `strip_memory` bytes.
+    Images that can't be decoded a strip at a time, such as JPEGs, are still
+    decoded in full. Returns the mismatch count of every (left, top, right,
+    bottom) tile that contains differences; an empty result means a match.
+    """
+    with Image.open(input_path1) as img1:
+        width, height = img1.size
+    bytes_per_pixel = STREAMING_BYTES_PER_PIXEL
+    if tolerance or stats is not None:
+        bytes_per_pixel += METRICS_BYTES_PER_PIXEL
+    strip_height = max(1, strip_memory // (width * bytes_per_pixel))
+    if strip_height >= tile_size:
+        # Keep tiles from straddling strip boundaries when possible
+        strip_height -= strip_height % tile_size
+    if stats is not None:
+        # Keep SSIM blocks whole
+        strip_height = max(
+            strip_height - strip_height % SSIM_BLOCK_SIZE, SSIM_BLOCK_SIZE
+        )
+
+    tile_counts = {}
+
+    def strips():
+        top = 0
+        for strip1, strip2 in zip(
+            iter_strips(input_path1, strip_height),
+            iter_strips(input_path2, strip_height),
+        ):
+            output, matches = diff_arrays(strip1, strip2, tolerance, stats)
+            count_tile_mismatches(~matches, top, tile_size, tile_counts)
+            top += strip1.height
+            yield output
+
+    if output_path is None:
+        for _ in strips():
+            pass
+    else:
+        write_png_strips(output_path, (width, height), strips())
+
+    return {
+        (left, top, min(left + tile_size, width), min(top + tile_size, height)): count
+        for (left, top), count in sorted(tile_counts.items(), key=lambda x: x[0][::-1])
+    }
+
+
+def process_images(
+    input_path1: Path,
+    input_path2: Path,
+    output_path: Path | None,
+    engine: str = "auto",
+    strip_memory: int | None = None,
+    tile_size: int = DEFAULT_TILE_SIZE,
+    write_identical: bool = False,
+    tolerance: int = 0,
+    max_mismatch_fraction: float | None = None,
+    min_ssim: float | None = None,
+    metrics_path: Path | None = None,
+) -> bool:
+    """
+    Compare two images, generating a difference image and returning True if they match.
+
+    Identical images are detected from digests of their decoded pixels, and no
+    difference image is written for them unless `write_identical` is set. If
+    `output_path` is None, only the verdict is computed: without tolerances or
+    metrics, decoding stops at the first strip that differs.
+
+    If `strip_memory` (in bytes) is given, the images are decoded and compared
+    in strips of about that working size, the difference image is written as it
+    goes and the mismatch count of each differing tile is printed. Pillow's
+    decompression bomb limit is lifted for them, since they aren't decoded whole
+    (except for formats `iter_strips` can't decode a strip at a time).
+
+    Pixels differing by at most `tolerance` in every channel count as matching.
+    The images match if the fraction of mismatched pixels is at most
+    `max_mismatch_fraction` and their SSIM score is at least `min_ssim`; with
+    neither threshold, every pixel has to match. The difference metrics are
+    written as JSON to `metrics_path`, if given.
+    """
+    if engine == "auto":
+        engine = "python" if np is None else "numpy"
+
+    if engine == "numpy" and np is None:
+        print("Error: The numpy engine requires numpy to be installed.")
+        sys.exit(1)
+
+    if strip_memory is not None and engine != "numpy":
+        print("Error: Streaming comparisons require the numpy engine.")
+        sys.exit(1)
+
+    if max_mismatch_fraction is None and min_ssim is None:
+        max_mismatch_fraction = 0.0
+
+    measured = bool(
+        tolerance or max_mismatch_fraction or min_ssim is not None or metrics_path
+    )
+    if measured and engine != "numpy":
+        print("Error: Tolerances and metrics require the numpy engine.")
+        sys.exit(1)
+
+    if strip_memory is not None:
+        Image.MAX_IMAGE_PIXELS = None
+
+    try:
         # Check if the images are the same size
-        if img1.size != img2.size:
-            print("Error: The input images must be the same size.")
-            sys.exit(1)
-
-        # Create a new image for the output
-        output_img = Image.new("RGB", img1.size)
-
-        # Process each pixel
-        pixels1 = img1.load()
-        pixels2 = img2.load()
-        output_pixels = output_img.load()
-
-        identical = True
-
-        for y in range(img1.size[1]):
-            for x in range(img1.size[0]):
-                pixel1 = pixels1[x, y]
-                pixel2 = pixels2[x, y]
-
-                # If the pixels match, use a faint version of the inputs
-                if pixel1 == pixel2:
-                    faint_pixel = tuple(
-                        int((value + 255 + 255) / 3) for value in pixel1[:3]
-                    )
-                    output_pixels[x, y] = faint_pixel
-                else:
-                    # If the pixels do not match, set the pixel to red
-                    output_pixels[x, y] = (255, 0, 0)
-                    identical = False
-
-        # Save the output image
-        output_img.save(output_path)
+        with Image.open(input_path1) as img1, Image.open(input_path2) as img2:
+            size = img1.size
+            if img1.size != img2.size:
+                print("Error: The input images must be the same size.")
+                sys.exit(1)
+
+        # Fast path: skip the per-pixel pass when the decoded pixels match
+        identical = pixels_identical(input_path1, input_path2)
+        if identical and metrics_path is not None:
+            pixels = size[0] * size[1]
+            metrics = summarize_metrics({"pixels": pixels, "ssim_blocks": 0})
+            metrics_path.write_text(json.dumps(metrics, indent=2), encoding="utf-8")
+        if identical and (output_path is None or not write_identical):
+            if output_path is not None:
+                print("The images are identical; no difference image written.")
+            return True
+        if output_path is None and not measured:
+            return identical
+
+        stats = {} if measured else None
+
+        if strip_memory is not None:
+            tile_counts = compare_streaming(
+                input_path1,
+                input_path2,
+                output_path,
+                strip_memory,
+                tile_size,
+                tolerance,
+                stats,
+            )
+            for (left, top, right, bottom), count in tile_counts.items():
+                print(f"Tile ({left}, {top})-({right}, {bottom}): {count} mismatches")
+            identical = not tile_counts
+        else:
+            # Load the images
+            img1 = Image.open(input_path1)
+            img2 = Image.open(input_path2)
+
+            if engine == "numpy":
+                output_img, identical = compare_numpy(img1, img2, tolerance, stats)
+            else:
+                output_img, identical = compare_python(img1, img2)
+
+            # Save the output image
+            if output_path is not None:
+                output_img.save(output_path)
+
+        if stats is not None:
+            metrics = summarize_metrics(stats)
+            if metrics_path is not None:
+                metrics_path.write_text(json.dumps(metrics, indent=2), encoding="utf-8")
+            identical = (
+                max_mismatch_fraction is None
+                or metrics["mismatch_fraction"] <= max_mismatch_fraction
+            ) and (min_ssim is None or metrics["ssim"] >= min_ssim)
+
         return identical
 
     except Exception as e:
@@ -54,17 +506,356 @@ def process_images(input_path1: Path, input_path2: Path, output_path: Path) -> b
         sys.exit(1)
 
 
+def pair_directories(dir1: Path, dir2: Path) -> list[tuple[str, Path, Path]]:
+    """Pair up the files with the same name in two directories."""
+    names1 = {path.name for path in dir1.iterdir() if path.is_file()}
+    names2 = {path.name for path in dir2.iterdir() if path.is_file()}
+
+    for name in sorted(names1 ^ names2):
+        print(f"Warning: {name} is only present in one directory.")
+
+    return [(name, dir1 / name, dir2 / name) for name in sorted(names1 & names2)]
+
+
+def read_manifest(manifest_path: Path) -> list[tuple[str, Path, Path]]:
+    """
+    Read image pairs from a CSV manifest with `input1` and `input2` columns.
+
+    Relative paths are relative to the manifest. An optional `name` column
+    names each pair; otherwise the name of the first file is used.
+    """
+    pairs = []
+    with manifest_path.open(newline="") as csvfile:
+        for row in csv.DictReader(csvfile):
+            path1 = manifest_path.parent / row["input1"]
+            path2 = manifest_path.parent / row["input2"]
+            pairs.append((row.get("name") or path1.name, path1, path2))
+    return pairs
+
+
+def file_signature(path: Path, previous: dict | None = None) -> dict:
+    """
+    Return the size, modification time and content digest of a file.
+
+    The digest from a `previous` signature is reused if the size and
+    modification time are unchanged.
+    """
+    stat = path.stat()
+    if (
+        previous is not None
+        and previous["size"] == stat.st_size
+        and previous["mtime_ns"] == stat.st_mtime_ns
+    ):
+        return previous
+
+    digest = hashlib.blake2b()
+    with path.open(mode="rb") as infile:
+        while chunk := infile.read(2**20):
+            digest.update(chunk)
+
+    return {
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "digest": digest.hexdigest(),
+    }
+
+
+def output_stem(name: str) -> str:
+    """
+    Return a file name stem for the outputs of the pair called `name`.
+
+    Characters other than letters, digits, "-" and "_" are replaced, and a
+    digest of the name keeps names that only differ in those characters (such
+    as plot.png and plot.jpg) apart.
+    """
+    safe = re.sub(r"[^A-Za-z0-9_-]+", "_", name).strip("_")
+    return f"{safe}-{hashlib.blake2b(name.encode(), digest_size=4).hexdigest()}"
+
+
+def compare_pair(
+    name: str, input_path1: Path, input_path2: Path, output_dir: Path, options: dict
+) -> dict:
+    """Compare one pair of images with `process_images` and return a report entry."""
+    stem = output_stem(name)
+    output_path = output_dir / f"{stem}-diff.png"
+    metrics_path = output_dir / f"{stem}-metrics.json"
+    output_path.unlink(missing_ok=True)
+    metrics_path.unlink(missing_ok=True)
+
+    entry = {"name": name, "input1": str(input_path1), "input2": str(input_path2)}
+
+    # Only the numpy engine (which "auto" resolves to, if installed) has metrics
+    measured = np is not None and options.get("engine", "auto") in ("auto", "numpy")
+
+    # process_images reports problems by printing and exiting
+    log = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(log):
+            entry["identical"] = process_images(
+                input_path1,
+                input_path2,
+                output_path,
+                metrics_path=metrics_path if measured else None,
+                **options,
+            )
+    except SystemExit:
+        entry["identical"] = False
+        entry["error"] = log.getvalue().strip()
+
+    entry["output"] = str(output_path) if output_path.exists() else None
+    if metrics_path.exists():
+        entry["metrics"] = json.loads(metrics_path.read_text(encoding="utf-8"))
+
+    return entry
+
+
+def write_html_report(report: dict, html_path: Path):
+    """Write a batch comparison report as an HTML table."""
+    rows = []
+    for entry in report["pairs"]:
+        metrics = entry.get("metrics", {})
+        cells = [
+            html.escape(entry["name"]),
+            "Pass" if entry["identical"] else html.escape(entry.get("error", "Fail")),
+            f"{metrics['mismatch_fraction']:.6f}" if metrics else "",
+            str(metrics["max_delta"]) if metrics else "",
+            f"{metrics['ssim']:.6f}" if metrics else "",
+        ]
+        if entry["output"]:
+            link = Path(os.path.relpath(entry["output"], html_path.parent)).as_posix()
+            cells.append(f'<a href="{html.escape(link)}">{html.escape(link)}</a>')
+        else:
+            cells.append("")
+
+        row_class = "pass" if entry["identical"] else "fail"
+        rows.append(
+            f'        <tr class="{row_class}">'
+            + "".join(f"<td>{cell}</td>" for cell in cells)
+            + "</tr>"
+        )
+
+    html_path.write_text(
+        HTML_REPORT_TEMPLATE.substitute(
+            summary=html.escape(
+                f"{report['passed']} of {len(report['pairs'])} pairs match."
+            ),
+            rows="\n".join(rows),
+        ),
+        encoding="utf-8",
+    )
+
+
+def compare_batch(
+    pairs: list[tuple[str, Path, Path]],
+    output_dir: Path,
+    report_path: Path,
+    html_path: Path | None = None,
+    workers: int | None = None,
+    **options,
+) -> bool:
+    """
+    Compare many image pairs in parallel and write a consolidated JSON report.
+
+    Pairs whose inputs and comparison options are unchanged since the previous
+    report at `report_path` reuse their previous results. The remaining options
+    are passed to `process_images`. Returns True if every pair matches.
+    """
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    previous = {}
+    if report_path.exists():
+        old_report = json.loads(report_path.read_text(encoding="utf-8"))
+        if old_report.get("options") == options:
+            previous = {entry["name"]: entry for entry in old_report["pairs"]}
+
+    entries = []
+    pending = []
+    for name, path1, path2 in pairs:
+        old_entry = previous.get(name, {})
+        old_signatures = old_entry.get("signatures", {})
+        signatures = {
+            "input1": file_signature(path1, old_signatures.get("input1")),
+            "input2": file_signature(path2, old_signatures.get("input2")),
+        }
+
+        if (
+            old_entry.get("input1") == str(path1)
+            and old_entry.get("input2") == str(path2)
+            and all(
+                signatures[key]["digest"] == old_signatures.get(key, {}).get("digest")
+                for key in signatures
+            )
+            and (old_entry["output"] is None or Path(old_entry["output"]).exists())
+        ):
+            entries.append({**old_entry, "signatures": signatures, "skipped": True})
+        else:
+            pending.append((name, path1, path2, signatures))
+
+    print(f"Comparing {len(pending)} pairs ({len(entries)} unchanged).")
+
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+        futures = {
+            executor.submit(compare_pair, name, path1, path2, output_dir, options): (
+                signatures
+            )
+            for name, path1, path2, signatures in pending
+        }
+        for future in as_completed(futures):
+            entry = future.result()
+            entries.append({**entry, "signatures": futures[future], "skipped": False})
+            print(f"{entry['name']}: {'match' if entry['identical'] else 'MISMATCH'}")
+
+    entries.sort(key=lambda entry: entry["name"])
+    report = {
+        "options": options,
+        "passed": sum(entry["identical"] for entry in entries),
+        "failed": sum(not entry["identical"] for entry in entries),
+        "pairs": entries,
+    }
+
+    report_path.write_text(json.dumps(report, indent=2), encoding="utf-8")
+    print(f"Report saved to {report_path}")
+
+    if html_path is not None:
+        write_html_report(report, html_path)
+        print(f"HTML report saved to {html_path}")
+
+    return report["failed"] == 0
+
+
 if __name__ == "__main__":
     import argparse
 
     parser = argparse.ArgumentParser(
-        description="Compare two PNG images and generate an output PNG."
+        description="Compare two PNG images and generate an output PNG.",
+        epilog="If both inputs are directories (or --manifest is given), every "
+        "pair of images is compared and --output is the output directory.",
+    )
+    parser.add_argument(
+        "input1", type=Path, nargs="?", help="Path to the first input PNG"
+    )
+    parser.add_argument(
+        "input2", type=Path, nargs="?", help="Path to the second input PNG"
+    )
+    parser.add_argument("--output", type=Path, help="Path to save the output PNG")
+    parser.add_argument(
+        "--verdict-only",
+        "--quiet",
+        action="store_true",
+        help="Only report the result through the exit code, without an output PNG",
+    )
+    parser.add_argument(
+        "--write-identical",
+        action="store_true",
+        help="Write the output PNG even if the images are identical",
+    )
+    parser.add_argument(
+        "--engine",
+        choices=ENGINES,
+        default="auto",
+        help="Comparison engine (auto uses numpy when it is installed)",
+    )
+    parser.add_argument(
+        "--streaming",
+        action="store_true",
+        help="Compare the images in strips, writing the output incrementally",
     )
-    parser.add_argument("input1", type=Path, help="Path to the first input PNG")
-    parser.add_argument("input2", type=Path, help="Path to the second input PNG")
     parser.add_argument(
-        "--output", type=Path, required=True, help="Path to save the output PNG"
+        "--strip-memory",
+        type=int,
+        default=DEFAULT_STRIP_MEMORY_MB,
+        metavar="MB",
+        help="Approximate working memory of each --streaming strip, including "
+        "decoding the inputs",
+    )
+    parser.add_argument(
+        "--tile-size",
+        type=int,
+        default=DEFAULT_TILE_SIZE,
+        metavar="px",
+        help="Tile size for the --streaming mismatch report",
+    )
+
+    parser.add_argument(
+        "--tolerance",
+        type=int,
+        default=0,
+        metavar="N",
+        help="Treat pixels as matching if no channel differs by more than N",
+    )
+    parser.add_argument(
+        "--max-mismatch-fraction",
+        type=float,
+        metavar="F",
+        help="Pass if at most this fraction of pixels is mismatched",
+    )
+    parser.add_argument(
+        "--min-ssim",
+        type=float,
+        metavar="S",
+        help="Fail if the block-wise SSIM score is below S",
+    )
+    parser.add_argument(
+        "--metrics", type=Path, help="Path to save the difference metrics as JSON"
+    )
+
+    parser.add_argument(
+        "--manifest",
+        type=Path,
+        help="CSV file listing image pairs (input1,input2[,name]) to compare",
+    )
+    parser.add_argument(
+        "--report",
+        type=Path,
+        help="Path to save the batch JSON report (default: OUTPUT/report.json)",
+    )
+    parser.add_argument("--html", type=Path, help="Path to save a batch HTML report")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        help="Number of parallel batch comparisons (default: number of CPUs)",
     )
 
     args = parser.parse_args()
-    sys.exit(0 if process_images(args.input1, args.input2, args.output) else 1)
+    options = {
+        "engine": args.engine,
+        "strip_memory": args.strip_memory * 2**20 if args.streaming else None,
+        "tile_size": args.tile_size,
+        "write_identical": args.write_identical,
+        "tolerance": args.tolerance,
+        "max_mismatch_fraction": args.max_mismatch_fraction,
+        "min_ssim": args.min_ssim,
+    }
+
+    if args.manifest is not None or (args.input1 and args.input1.is_dir()):
+        if args.output is None:
+            parser.error("--output is required for batch comparisons")
+        if args.manifest is not None:
+            pairs = read_manifest(args.manifest)
+        elif args.input2 is not None and args.input2.is_dir():
+            pairs = pair_directories(args.input1, args.input2)
+        else:
+            parser.error("both inputs must be directories for batch comparisons")
+
+        passed = compare_batch(
+            pairs,
+            args.output,
+            args.report or args.output / "report.json",
+            html_path=args.html,
+            workers=args.workers,
+            **options,
+        )
+        sys.exit(0 if passed else 1)
+
+    if args.input1 is None or args.input2 is None:
+        parser.error("two input images are required")
+
+    if args.verdict_only:
+        args.output = None
+    elif args.output is None:
+        parser.error("--output is required unless --verdict-only is given")
+
+    identical = process_images(
+        args.input1, args.input2, args.output, metrics_path=args.metrics, **options
+    )
+    sys.exit(0 if identical else 1)
@@ -0,0 +1,369 @@
+"""
+Decode images a horizontal strip at a time.
+
+Non-interlaced PNGs and striped or tiled TIFFs are decoded band by band, so
+only a few strips of pixels are ever held in memory. Other images are decoded
+whole and then cut into strips.
+
+Each band is decoded by Pillow from a small in-memory file holding just that
+band's compressed data, so the strips have the same mode, palette and pixel
+values as the whole decoded image would.
+"""
+
+import io
+import math
+import struct
+import zlib
+from collections.abc import Iterator
+from pathlib import Path
+
+from PIL import Image, TiffImagePlugin
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+# Channels per pixel of each PNG color type
+PNG_CHANNELS = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}
+# 8-bit color types that Pillow decodes without changing the bytes, by the
+# number of bytes per pixel; used to undo the row filters
+PNG_BYTE_TYPES = {1: 0, 2: 4, 3: 2, 4: 6}
+# Chunks besides IHDR that affect the decoded pixels
+PNG_PIXEL_CHUNKS = (b"PLTE", b"tRNS")
+# Largest piece of compressed data to read or inflate at once
+READ_SIZE = 2**20
+
+# TIFF tags that describe how the strips or tiles are encoded
+TIFF_IMAGE_WIDTH = 256
+TIFF_IMAGE_LENGTH = 257
+TIFF_STRIP_OFFSETS = 273
+TIFF_ROWS_PER_STRIP = 278
+TIFF_STRIP_BYTE_COUNTS = 279
+TIFF_PLANAR_CONFIGURATION = 284
+TIFF_TILE_WIDTH = 322
+TIFF_TILE_LENGTH = 323
+TIFF_TILE_OFFSETS = 324
+TIFF_TILE_BYTE_COUNTS = 325
+TIFF_DECODING_TAGS = (
+    TIFF_IMAGE_WIDTH,
+    258,  # BitsPerSample
+    259,  # Compression
+    262,  # PhotometricInterpretation
+    266,  # FillOrder
+    277,  # SamplesPerPixel
+    TIFF_PLANAR_CONFIGURATION,
+    317,  # Predictor
+    320,  # ColorMap
+    TIFF_TILE_WIDTH,
+    TIFF_TILE_LENGTH,
+    338,  # ExtraSamples
+    339,  # SampleFormat
+    347,  # JPEGTables
+    530,  # YCbCrSubSampling
+    532,  # ReferenceBlackWhite
+)
+TIFF_LONG = 4
+
+
+def png_chunk(tag: bytes, data: bytes) -> bytes:
+    """Return a PNG chunk with its length and CRC."""
+    return (
+        struct.pack(">I", len(data))
+        + tag
+        + data
+        + struct.pack(">I", zlib.crc32(tag + data))
+    )
+
+
+def png_image(ihdr: tuple, chunks: list[bytes], rows: bytes) -> Image.Image:
+    """Decode a PNG made of an IHDR, the given chunks and filtered `rows`."""
+    data = b"".join(
+        [
+            PNG_SIGNATURE,
+            png_chunk(b"IHDR", struct.pack(">IIBBBBB", *ihdr, 0, 0, 0)),
+            *chunks,
+            # Storing the rows uncompressed is quick, and Pillow inflates them
+            png_chunk(b"IDAT", zlib.compress(rows, 0)),
+            png_chunk(b"IEND", b""),
+        ]
+    )
+    img = Image.open(io.BytesIO(data))
+    img.load()
+    return img
+
+
+def png_bands(path: Path, band_height: int) -> Iterator[Image.Image] | None:
+    """
+    Return an iterator over bands of `band_height` rows of a PNG.
+
+    Returns None for interlaced PNGs and for 16-bit RGB(A) PNGs, which can't be
+    decoded band by band this way.
+    """
+    infile = path.open(mode="rb")
+    if infile.read(8) != PNG_SIGNATURE:
+        infile.close()
+        return None
+
+    chunks = []
+    while True:
+        length, tag = struct.unpack(">I4s", infile.read(8))
+        if tag == b"IDAT":
+            break
+        data = infile.read(length)
+        infile.read(4)  # CRC
+        if tag == b"IHDR":
+            width, height, bit_depth, color_type, _, _, interlace = struct.unpack(
+                ">IIBBBBB", data
+            )
+        elif tag in PNG_PIXEL_CHUNKS:
+            chunks.append(png_chunk(tag, data))
+
+    pixel_bits = PNG_CHANNELS[color_type] * bit_depth
+    pixel_bytes = max(1, pixel_bits // 8)
+    if interlace or pixel_bytes not in PNG_BYTE_TYPES:
+        infile.close()
+        return None
+
+    return _png_bands(
+        infile,
+        length,
+        (width, height, bit_depth, color_type),
+        chunks,
+        math.ceil(width * pixel_bits / 8),
+        pixel_bytes,
+        band_height,
+    )
+
+
+def _png_compressed(infile, length: int) -> Iterator[bytes]:
+    """Yield the compressed image data from the first IDAT chunk onwards."""
+    while True:
+        while length:
+            piece = infile.read(min(length, READ_SIZE))
+            length -= len(piece)
+            yield piece
+        infile.read(4)  # CRC
+
+        length, tag = struct.unpack(">I4s", infile.read(8))
+        if tag != b"IDAT":
+            return
+
+
+def _png_inflated(pieces: Iterator[bytes]) -> Iterator[bytes]:
+    """Inflate compressed data without ever producing a large piece at once."""
+    decompressor = zlib.decompressobj()
+    for piece in pieces:
+        while piece:
+            yield decompressor.decompress(piece, READ_SIZE)
+            piece = decompressor.unconsumed_tail
+    yield decompressor.flush()
+
+
+def _png_bands(
+    infile,
+    length: int,
+    ihdr: tuple,
+    chunks: list[bytes],
+    row_bytes: int,
+    pixel_bytes: int,
+    band_height: int,
+) -> Iterator[Image.Image]:
+    """Undo the row filters and decode the PNG's rows a band at a time."""
+    width, height = ihdr[:2]
+    stride = 1 + row_bytes
+    # Undo the filters as if the rows held 8-bit pixels of the same size
+    byte_width = row_bytes // pixel_bytes
+    byte_type = PNG_BYTE_TYPES[pixel_bytes]
+    previous = None
+    pending = bytearray()
+    top = 0
+
+    with infile:
+        inflated = _png_inflated(_png_compressed(infile, length))
+        while top < height:
+            rows = min(band_height, height - top)
+            while len(pending) < rows * stride:
+                pending += next(inflated)
+
+            filtered = bytes(pending[: rows * stride])
+            del pending[: rows * stride]
+
+            # The filters refer to the previous row, so start from it (unfiltered)
+            if previous is not None:
+                filtered = b"\x00" + previous + filtered
+            unfiltered = png_image(
+                (byte_width, rows + (previous is not None), 8, byte_type), [], filtered
+            ).tobytes()
+            if previous is not None:
+                unfiltered = unfiltered[row_bytes:]
+            previous = unfiltered[-row_bytes:]
+
+            # Decode the band for real, from rows that are no longer filtered
+            yield png_image(
+                (width, rows, *ihdr[2:]),
+                chunks,
+                b"".join(
+                    b"\x00" + unfiltered[start : start + row_bytes]
+                    for start in range(0, len(unfiltered), row_bytes)
+                ),
+            )
+            top += rows
+
+
+def tiff_bands(path: Path, band_height: int) -> Iterator[Image.Image] | None:
+    """
+    Return an iterator over bands of whole strips or rows of tiles of a TIFF.
+
+    Bands have about `band_height` rows, but never less than one strip or row
+    of tiles. Returns None for TIFFs whose samples are stored in separate
+    planes.
+    """
+    with Image.open(path) as img:
+        tags = img.tag_v2
+        width, height = img.size
+
+        if tags.get(TIFF_PLANAR_CONFIGURATION, 1) != 1:
+            return None
+
+        if TIFF_TILE_OFFSETS in tags:
+            unit_height = tags[TIFF_TILE_LENGTH]
+            per_unit = math.ceil(width / tags[TIFF_TILE_WIDTH])
+            offsets_tag, counts_tag = TIFF_TILE_OFFSETS, TIFF_TILE_BYTE_COUNTS
+        else:
+            unit_height = min(tags.get(TIFF_ROWS_PER_STRIP, height), height)
+            per_unit = 1
+            offsets_tag, counts_tag = TIFF_STRIP_OFFSETS, TIFF_STRIP_BYTE_COUNTS
+
+        header = TiffImagePlugin.ImageFileDirectory_v2()
+        for tag in TIFF_DECODING_TAGS:
+            if tag in tags:
+                header[tag] = tags[tag]
+                header.tagtype[tag] = tags.tagtype[tag]
+        offsets = list(tags[offsets_tag])
+        counts = list(tags[counts_tag])
+
+    return _tiff_bands(
+        path,
+        header,
+        (offsets_tag, counts_tag),
+        offsets,
+        counts,
+        height,
+        unit_height,
+        per_unit,
+        max(1, band_height // unit_height),
+    )
+
+
+def _tiff_bands(
+    path: Path,
+    header: TiffImagePlugin.ImageFileDirectory_v2,
+    block_tags: tuple[int, int],
+    offsets: list[int],
+    counts: list[int],
+    height: int,
+    unit_height: int,
+    per_unit: int,
+    units_per_band: int,
+) -> Iterator[Image.Image]:
+    """Decode each band from a TIFF that holds just its strips or tiles."""
+    offsets_tag, counts_tag = block_tags
+
+    with path.open(mode="rb") as infile:
+        for top in range(0, height, unit_height * units_per_band):
+            rows = min(unit_height * units_per_band, height - top)
+            first = top // unit_height * per_unit
+            last = first + math.ceil(rows / unit_height) * per_unit
+
+            blocks = []
+            for offset, count in zip(offsets[first:last], counts[first:last]):
+                infile.seek(offset)
+                blocks.append(infile.read(count))
+
+            header[TIFF_IMAGE_LENGTH] = rows
+            if offsets_tag == TIFF_STRIP_OFFSETS:
+                header[TIFF_ROWS_PER_STRIP] = unit_height
+                header.tagtype[TIFF_ROWS_PER_STRIP] = TIFF_LONG
+            header[counts_tag] = [len(block) for block in blocks]
+            header.tagtype[counts_tag] = TIFF_LONG
+
+            # The blocks follow the header. Pillow writes strip offsets relative
+            # to the end of the header, like its own TIFF writer expects, but
+            # tile offsets as they are.
+            header[offsets_tag] = [0] * len(blocks)
+            header.tagtype[offsets_tag] = TIFF_LONG
+            start = (
+                0 if offsets_tag == TIFF_STRIP_OFFSETS else 8 + len(header.tobytes(8))
+            )
+            block_offsets = []
+            for block in blocks:
+                block_offsets.append(start)
+                start += len(block)
+            header[offsets_tag] = block_offsets
+            header.tagtype[offsets_tag] = TIFF_LONG
+
+            data = header.tobytes(8)
+            img = Image.open(
+                io.BytesIO(b"II*\x00" + struct.pack("<I", 8) + data + b"".join(blocks))
+            )
+            img.load()
+            yield img
+
+
+def whole_bands(path: Path) -> Iterator[Image.Image]:
+    """Decode the whole image as a single band."""
+    with Image.open(path) as img:
+        img.load()
+        yield img
+
+
+def iter_bands(path: Path, band_height: int) -> Iterator[Image.Image]:
+    """Yield bands of rows of an image, from top to bottom."""
+    with Image.open(path) as img:
+        image_format = img.format
+
+    bands = None
+    if image_format == "PNG":
+        bands = png_bands(path, band_height)
+    elif image_format == "TIFF":
+        bands = tiff_bands(path, band_height)
+    return whole_bands(path) if bands is None else bands
+
+
+def iter_strips(path: Path, strip_height: int) -> Iterator[Image.Image]:
+    """
+    Yield strips of `strip_height` rows of an image, from top to bottom.
+
+    The last strip may be shorter. See the module docstring for which images
+    are decoded a strip at a time.
+    """
+    pieces = []
+    rows = 0
+    for band in iter_bands(path, strip_height):
+        top = 0
+        while top < band.height:
+            take = min(strip_height - rows, band.height - top)
+            if take == band.height:
+                pieces.append(band)
+            else:
+                pieces.append(band.crop((0, top, band.width, top + take)))
+            rows += take
+            top += take
+            if rows == strip_height:
+                yield join_strips(pieces)
+                pieces, rows = [], 0
+    if pieces:
+        yield join_strips(pieces)
+
+
+def join_strips(pieces: list[Image.Image]) -> Image.Image:
+    """Stack strips of the same width, keeping the first one's mode and palette."""
+    if len(pieces) == 1:
+        return pieces[0]
+
+    # Cropping beyond the bottom keeps the palette and extends the strip
+    joined = pieces[0].crop(
+        (0, 0, pieces[0].width, sum(piece.height for piece in pieces))
+    )
+    top = pieces[0].height
+    for piece in pieces[1:]:
+        joined.paste(piece, (0, top))
+        top += piece.height
+    return joined
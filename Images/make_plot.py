@@ -2,46 +2,412 @@
 """Create a scatter plot."""
 
 import argparse
+import contextlib
+import csv
+import hashlib
+import json
+import os
+import shutil
 import time
-
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
 
-import matplotlib.pyplot as plt
+import matplotlib
 import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+# Everything besides the data that affects the plot, for the cache key
+PLOT_PARAMS = {
+    "figsize": (8, 6),
+    "dpi": 300,
+    "color": "blue",
+    "alpha": 0.7,
+    "bbox_inches": "tight",
+}
+
+DETERMINISTIC_SEED = 0
+DEFAULT_CACHE_SIZE_MB = 512
+
+# Ways to draw too many points for a plain vector scatter plot
+DENSE_MODES = ("rasterize", "density", "decimate")
+# Size of each density bin, in pixels of the saved figure
+DENSITY_BIN_PX = 4
+# Decimation keeps one point per cell of this many marker widths
+DECIMATE_CELL_MARKERS = 0.5
+
+
+class PlotCache:
+    """A size-limited, least-recently-used cache of plot files keyed by content."""
+
+    def __init__(self, cache_dir: Path, max_bytes: int = DEFAULT_CACHE_SIZE_MB * 2**20):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def key(
+        x: np.ndarray,
+        y: np.ndarray,
+        suffix: str,
+        dense: str | None = None,
+        deterministic: bool = False,
+    ) -> str:
+        """
+        Return the cache key for plotting this data to this file type.
 
+        Deterministic plots are saved without timestamps, so they have their
+        own entries.
+        """
+        digest = hashlib.blake2b(x.tobytes())
+        digest.update(y.tobytes())
+        digest.update(
+            json.dumps(
+                [
+                    PLOT_PARAMS,
+                    matplotlib.__version__,
+                    suffix.lower(),
+                    dense,
+                    deterministic,
+                ]
+            ).encode("utf-8")
+        )
+        return digest.hexdigest() + suffix.lower()
 
-def make_plot(output_filename: Path):
-    """Make a scatter plot and save it as the given filename."""
+    def fetch(self, key: str, output_path: Path) -> bool:
+        """Copy the cached plot to `output_path`, returning False if it isn't cached."""
+        cached = self.cache_dir / key
+        try:
+            shutil.copyfile(cached, output_path)
+        except FileNotFoundError:
+            self.misses += 1
+            return False
+
+        # Mark the entry as recently used
+        cached.touch()
+        self.hits += 1
+        return True
+
+    def store(self, key: str, plot_path: Path):
+        """Add a plot to the cache, evicting the least recently used entries."""
+        # Copy then rename so other processes never see a partial file
+        partial = self.cache_dir / f"{key}.{os.getpid()}.partial"
+        shutil.copyfile(plot_path, partial)
+        partial.replace(self.cache_dir / key)
+        self.evict()
+
+    def evict(self):
+        """Remove the least recently used entries until the cache fits its limit."""
+        entries = []
+        for path in self.cache_dir.iterdir():
+            if path.suffix != ".partial":
+                with contextlib.suppress(FileNotFoundError):
+                    entries.append((path.stat().st_mtime, path.stat().st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+
+
+def generate_data(
+    seed: int | None = None, points: int = 100
+) -> tuple[np.ndarray, np.ndarray]:
+    """Generate the scatter plot data, seeding the subtle error with `seed`."""
     # Generate data
-    np.random.seed(42)
-    x = np.linspace(0, 10, 100)
-    noise = np.random.normal(0, 1, size=100)
+    rng = np.random.RandomState(42)
+    x = np.linspace(0, 10, points)
+    noise = rng.normal(0, 1, size=points)
     y = 2 * x + noise
 
     # Intentional subtle error: modify x values slightly
-    np.random.seed(int(time.time()))
-    # x[10:-10] += np.random.normal(0, 0.1, size=80)  # Error: Adds small noise to x
+    rng = np.random.RandomState(int(time.time()) if seed is None else seed)
+    # x[10:-10] += rng.normal(0, 0.1, size=80)  # Error: Adds small noise to x
     # Pick a random point and adjust it vertically
-    y[np.random.randint(low=10, high=90)] += np.random.normal(0, 0.1)
+    y[rng.randint(low=points // 10, high=points - points // 10)] += rng.normal(0, 0.1)
+
+    return x, y
+
+
+def decimate(
+    x: np.ndarray, y: np.ndarray, shape: tuple[int, int]
+) -> tuple[np.ndarray, np.ndarray]:
+    """Keep only the first point that falls in each cell of a `shape` grid."""
+    columns = np.minimum(
+        ((x - x.min()) / (np.ptp(x) or 1) * shape[0]).astype(np.int64), shape[0] - 1
+    )
+    rows = np.minimum(
+        ((y - y.min()) / (np.ptp(y) or 1) * shape[1]).astype(np.int64), shape[1] - 1
+    )
+    _, keep = np.unique(rows * shape[0] + columns, return_index=True)
+    keep.sort()
+    return x[keep], y[keep]
+
+
+def draw_plot(x: np.ndarray, y: np.ndarray, dense: str | None = None) -> Figure:
+    """
+    Draw the scatter plot on a new Agg figure.
+
+    For large data, `dense` selects one of DENSE_MODES: "rasterize" draws the
+    points as an image, "density" draws a 2D histogram of them and "decimate"
+    keeps one point per pixel. The axes, labels and legend stay vectors.
+    """
+    fig = Figure(figsize=PLOT_PARAMS["figsize"], dpi=PLOT_PARAMS["dpi"])
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+
+    # The plot area in pixels of the saved figure
+    bbox = ax.get_window_extent()
+    shape = (max(int(bbox.width), 1), max(int(bbox.height), 1))
+
+    if dense == "density":
+        counts, x_edges, y_edges = np.histogram2d(
+            x,
+            y,
+            bins=(
+                max(shape[0] // DENSITY_BIN_PX, 1),
+                max(shape[1] // DENSITY_BIN_PX, 1),
+            ),
+        )
+        image = ax.imshow(
+            np.ma.masked_equal(counts.T, 0),
+            origin="lower",
+            extent=(x_edges[0], x_edges[-1], y_edges[0], y_edges[-1]),
+            aspect="auto",
+            interpolation="nearest",
+            cmap="Blues",
+        )
+        fig.colorbar(image, ax=ax, label="Data Points")
+    else:
+        if dense == "decimate":
+            # Points closer than a fraction of a marker would hide each other
+            marker_px = matplotlib.rcParams["lines.markersize"] * fig.dpi / 72
+            cell_px = max(marker_px * DECIMATE_CELL_MARKERS, 1)
+            x, y = decimate(
+                x, y, (int(shape[0] / cell_px) or 1, int(shape[1] / cell_px) or 1)
+            )
+
+        # Create scatter plot
+        ax.scatter(
+            x,
+            y,
+            label="Data Points",
+            color=PLOT_PARAMS["color"],
+            alpha=PLOT_PARAMS["alpha"],
+            rasterized=dense == "rasterize",
+        )
+        # Finding the "best" legend location is slow with many points
+        ax.legend(loc="upper left" if dense else "best")
+
+    ax.set_xlabel("X values")
+    ax.set_ylabel("Y values")
+    ax.grid(True)
+
+    fig.tight_layout()
+    return fig
+
+
+def make_plot(
+    output_filename: Path,
+    seed: int | None = None,
+    deterministic: bool = False,
+    cache: PlotCache | None = None,
+    points: int = 100,
+    dense: str | None = None,
+) -> dict:
+    """
+    Make a scatter plot of `points` points and save it as the given filename.
 
-    # Create scatter plot
-    plt.figure(figsize=(8, 6), dpi=300)
-    plt.scatter(x, y, label="Data Points", color="blue", alpha=0.7)
-    plt.xlabel("X values")
-    plt.ylabel("Y values")
-    plt.legend()
-    plt.grid(True)
+    In `deterministic` mode the random error uses a fixed seed (unless `seed`
+    is given) and no timestamps are saved in the file. If a `cache` is given,
+    plots of identical data are copied from it instead of being redrawn.
+    See `draw_plot` for the `dense` modes.
 
-    # Save and display the plot
-    plt.tight_layout()
-    plt.savefig(output_filename, bbox_inches="tight")
+    Returns how long drawing and saving the figure took, in seconds, and
+    whether the plot came from the cache.
+    """
+    if deterministic and seed is None:
+        seed = DETERMINISTIC_SEED
+
+    start = time.perf_counter()
+    x, y = generate_data(seed, points)
+    result = {"output": str(output_filename), "cached": False}
+
+    if cache is not None:
+        key = cache.key(x, y, output_filename.suffix, dense, deterministic)
+        if cache.fetch(key, output_filename):
+            return {
+                **result,
+                "cached": True,
+                "draw_s": 0.0,
+                "save_s": time.perf_counter() - start,
+            }
+
+    fig = draw_plot(x, y, dense)
+    drawn = time.perf_counter()
+
+    # Save the plot, leaving out creation dates if it should be reproducible
+    metadata = None
+    if deterministic:
+        metadata = {".pdf": {"CreationDate": None}, ".svg": {"Date": None}}.get(
+            output_filename.suffix.lower()
+        )
+    fig.savefig(
+        output_filename, bbox_inches=PLOT_PARAMS["bbox_inches"], metadata=metadata
+    )
+    saved = time.perf_counter()
+
+    # Release the figure's memory now rather than at garbage collection
+    fig.clear()
+
+    if cache is not None:
+        cache.store(key, output_filename)
+
+    return {**result, "draw_s": drawn - start, "save_s": saved - drawn}
+
+
+def warm_up():
+    """Load matplotlib's fonts and renderer so the first real plot isn't slowed."""
+    fig = Figure(figsize=(1, 1))
+    FigureCanvasAgg(fig)
+    fig.add_subplot().set_xlabel("X values")
+    fig.canvas.draw()
+
+
+def make_plots(
+    manifest_path: Path,
+    workers: int | None = None,
+    deterministic: bool = False,
+    cache: PlotCache | None = None,
+    points: int = 100,
+    dense: str | None = None,
+) -> list[dict]:
+    """
+    Make every plot listed in a CSV manifest with `output` and `seed` columns.
+
+    The plots are made by a pool of worker processes that are warmed up before
+    the first plot. Relative output paths are relative to the manifest.
+    """
+    with manifest_path.open(newline="") as csvfile:
+        jobs = [
+            (
+                manifest_path.parent / row["output"],
+                int(row["seed"]) if row.get("seed") else None,
+            )
+            for row in csv.DictReader(csvfile)
+        ]
+
+    results = []
+    with ProcessPoolExecutor(
+        max_workers=workers or os.cpu_count(), initializer=warm_up
+    ) as executor:
+        futures = [
+            executor.submit(
+                make_plot, output, seed, deterministic, cache, points, dense
+            )
+            for output, seed in jobs
+        ]
+        for future in as_completed(futures):
+            result = future.result()
+            print(describe_result(result))
+            results.append(result)
+
+    total_draw = sum(result["draw_s"] for result in results)
+    total_save = sum(result["save_s"] for result in results)
+    print(
+        f"{len(results)} plots: {total_draw:.2f} s drawing, {total_save:.2f} s saving"
+    )
+    if cache is not None:
+        hits = sum(result["cached"] for result in results)
+        print(f"Cache: {hits} hits, {len(results) - hits} misses")
+    return results
+
+
+def describe_result(result: dict) -> str:
+    """Describe how a plot was made and how long it took."""
+    if result["cached"]:
+        return f"{result['output']}: copied from cache in {result['save_s']:.3f} s"
+    return (
+        f"{result['output']}: drawn in {result['draw_s']:.3f} s, "
+        f"saved in {result['save_s']:.3f} s"
+    )
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(
         description="Generate a consistent, unchanging scatter plot."
     )
-    parser.add_argument("outfile", type=Path, help="Output filename for the plot")
+    parser.add_argument(
+        "outfile", type=Path, nargs="?", help="Output filename for the plot"
+    )
+    parser.add_argument(
+        "--seed", type=int, help="Seed for the random error (default: current time)"
+    )
+    parser.add_argument(
+        "--manifest",
+        type=Path,
+        help="CSV file of plots (output,seed) to make in a pool of workers",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        help="Number of worker processes for --manifest (default: number of CPUs)",
+    )
+    parser.add_argument(
+        "--deterministic",
+        action="store_true",
+        help=f"Use a fixed seed ({DETERMINISTIC_SEED} unless --seed is given) and "
+        "leave timestamps out of the output",
+    )
+    parser.add_argument(
+        "--cache-dir", type=Path, help="Reuse previously made plots of the same data"
+    )
+    parser.add_argument(
+        "--cache-size",
+        type=int,
+        default=DEFAULT_CACHE_SIZE_MB,
+        metavar="MB",
+        help="Maximum size of --cache-dir",
+    )
+    parser.add_argument(
+        "--points", type=int, default=100, help="Number of points to plot"
+    )
+    parser.add_argument(
+        "--dense",
+        choices=DENSE_MODES,
+        help="Draw many points as a raster layer, a density image or one point "
+        "per pixel, keeping the axes as vectors",
+    )
 
     args = parser.parse_args()
-    make_plot(args.outfile)
+    cache = None
+    if args.cache_dir is not None:
+        cache = PlotCache(args.cache_dir, args.cache_size * 2**20)
+
+    if args.manifest is not None:
+        make_plots(
+            args.manifest,
+            args.workers,
+            args.deterministic,
+            cache,
+            args.points,
+            args.dense,
+        )
+    elif args.outfile is not None:
+        result = make_plot(
+            args.outfile,
+            args.seed,
+            args.deterministic,
+            cache,
+            args.points,
+            args.dense,
+        )
+        if cache is not None:
+            print(describe_result(result))
+            print(f"Cache: {cache.hits} hits, {cache.misses} misses")
+    else:
+        parser.error("an output filename or --manifest is required")
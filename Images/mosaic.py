@@ -1,47 +1,292 @@
 #!/usr/bin/env python3
 """
-Tile two images horizontally in a mosaic.
+Tile two or more images in a grid mosaic.
 
 (This is much worse than using imagemagick).
 """
 
 import argparse
+import math
+import struct
+from collections.abc import Iterable
 from pathlib import Path
 
 from PIL import Image
 
+# TIFF field types for the struct formats used in the image file directory
+TIFF_TYPES = {"H": 3, "I": 4, "Q": 16}
 
-def create_horizontal_mosaic(input_paths: list[Path], output_path: Path):
-    """Create a horizontal mosaic of two or more images."""
+
+def image_sizes(input_paths: list[Path]) -> list[tuple[int, int]]:
+    """Return the size of each image, reading only the file headers."""
+    sizes = []
+    for path in input_paths:
+        with Image.open(path) as img:
+            sizes.append(img.size)
+    return sizes
+
+
+def grid_layout(
+    sizes: list[tuple[int, int]],
+    columns: int,
+    padding: int = 0,
+    thumbnail: tuple[int, int] | None = None,
+) -> tuple[tuple[int, int], tuple[int, int], list[tuple[int, int]]]:
+    """
+    Lay out images of the given sizes in a grid of equal cells.
+
+    Every cell is large enough for the largest image (or `thumbnail`, if that is
+    smaller), with `padding` pixels between and around the cells. Returns the
+    canvas size, the cell size and the top-left corner of each cell.
+    """
+    cell_width = max(width for width, _ in sizes)
+    cell_height = max(height for _, height in sizes)
+    if thumbnail is not None:
+        cell_width = min(cell_width, thumbnail[0])
+        cell_height = min(cell_height, thumbnail[1])
+
+    columns = min(columns, len(sizes))
+    rows = math.ceil(len(sizes) / columns)
+
+    canvas_size = (
+        columns * cell_width + (columns + 1) * padding,
+        rows * cell_height + (rows + 1) * padding,
+    )
+    corners = [
+        (
+            padding + (index % columns) * (cell_width + padding),
+            padding + (index // columns) * (cell_height + padding),
+        )
+        for index in range(len(sizes))
+    ]
+
+    return canvas_size, (cell_width, cell_height), corners
+
+
+def load_image(path: Path, thumbnail: tuple[int, int] | None = None) -> Image.Image:
+    """Load an image, shrinking it to fit within `thumbnail` as it is decoded."""
+    with Image.open(path) as img:
+        if thumbnail is not None:
+            # Let JPEGs decode at a reduced scale; thumbnail() then uses reduce()
+            img.draft("RGB", thumbnail)
+            img.thumbnail(thumbnail)
+        # thumbnail() doesn't load an image that already fits, and the file is
+        # closed on leaving this block
+        img.load()
+        return img
+
+
+def paste_centered(
+    canvas: Image.Image,
+    path: Path,
+    corner: tuple[int, int],
+    cell_size: tuple[int, int],
+    thumbnail: tuple[int, int] | None = None,
+):
+    """Load an image and paste it centered in the cell at `corner`, then release it."""
+    img = load_image(path, thumbnail)
+    canvas.paste(
+        img,
+        (
+            corner[0] + (cell_size[0] - img.size[0]) // 2,
+            corner[1] + (cell_size[1] - img.size[1]) // 2,
+        ),
+    )
+    img.close()
+
+
+def write_tiff_strips(
+    output_path: Path,
+    size: tuple[int, int],
+    rows_per_strip: int,
+    strips: Iterable[bytes],
+):
+    """
+    Write strips of raw RGB pixels to an uncompressed TIFF as they are produced.
+
+    Every strip but the last must have `rows_per_strip` rows. Files too large
+    for the 32-bit offsets of a classic TIFF are written as BigTIFF.
+    """
+    width, height = size
+    bigtiff = width * height * 3 + 2**16 >= 2**32
+    offset_format = "Q" if bigtiff else "I"
+    field_size = struct.calcsize(offset_format)
+
+    strip_offsets = []
+    strip_byte_counts = []
+
+    with output_path.open(mode="wb") as outfile:
+        # Leave room for the header, which points to the directory at the end
+        outfile.write(bytes(16 if bigtiff else 8))
+
+        for strip in strips:
+            strip_offsets.append(outfile.tell())
+            strip_byte_counts.append(len(strip))
+            outfile.write(strip)
+
+        if outfile.tell() % 2:
+            outfile.write(b"\0")
+        ifd_offset = outfile.tell()
+
+        tags = [
+            (256, "I", [width]),  # ImageWidth
+            (257, "I", [height]),  # ImageLength
+            (258, "H", [8, 8, 8]),  # BitsPerSample
+            (259, "H", [1]),  # Compression: none
+            (262, "H", [2]),  # PhotometricInterpretation: RGB
+            (273, offset_format, strip_offsets),  # StripOffsets
+            (277, "H", [3]),  # SamplesPerPixel
+            (278, "I", [rows_per_strip]),  # RowsPerStrip
+            (279, offset_format, strip_byte_counts),  # StripByteCounts
+            (284, "H", [1]),  # PlanarConfiguration: contiguous
+        ]
+
+        # Values that don't fit in an entry are stored after the directory
+        count_format = "Q" if bigtiff else "H"
+        entry_size = 4 + 2 * field_size
+        extra_offset = ifd_offset + field_size * 2 + len(tags) * entry_size
+        if not bigtiff:
+            extra_offset -= 2
+
+        entries = []
+        extra = b""
+        for tag, value_format, values in tags:
+            data = struct.pack(f"<{len(values)}{value_format}", *values)
+            if len(data) <= field_size:
+                value = data.ljust(field_size, b"\0")
+            else:
+                value = struct.pack(f"<{offset_format}", extra_offset + len(extra))
+                extra += data + b"\0" * (len(data) % 2)
+            entries.append(
+                struct.pack(
+                    f"<HH{offset_format}", tag, TIFF_TYPES[value_format], len(values)
+                )
+                + value
+            )
+
+        outfile.write(struct.pack(f"<{count_format}", len(tags)))
+        outfile.write(b"".join(entries))
+        outfile.write(bytes(field_size))  # No further directories
+        outfile.write(extra)
+
+        outfile.seek(0)
+        if bigtiff:
+            outfile.write(b"II+\0" + struct.pack("<HHQ", 8, 0, ifd_offset))
+        else:
+            outfile.write(b"II*\0" + struct.pack("<I", ifd_offset))
+
+
+def create_mosaic(
+    input_paths: list[Path],
+    output_path: Path,
+    columns: int | None = None,
+    padding: int = 0,
+    background: str = "black",
+    thumbnail: tuple[int, int] | None = None,
+    out_of_core: bool = False,
+    band_height: int | None = None,
+):
+    """
+    Create a grid mosaic of two or more images, one row by default.
+
+    Images smaller than their cell are centered in it. Only one input image is
+    open at a time, and each is released after it is pasted.
+
+    If `out_of_core` is set, the mosaic is built and written to a TIFF file one
+    horizontal band at a time, decoding only the images that overlap each band.
+    Bands are one row of cells high unless `band_height` is given.
+    """
     if len(input_paths) < 2:
         raise ValueError("Please supply at least two images.")
 
-    imgs = [Image.open(path) for path in input_paths]
+    canvas_size, cell_size, corners = grid_layout(
+        image_sizes(input_paths), columns or len(input_paths), padding, thumbnail
+    )
+
+    if out_of_core:
+        if output_path.suffix.lower() not in (".tif", ".tiff"):
+            raise ValueError("Out-of-core mosaics must be saved as TIFF files.")
+
+        band_height = band_height or cell_size[1] + padding
 
-    if len({img.size for img in imgs}) > 1:
-        raise ValueError("Input images must have equal sizes")
+        def bands():
+            for band_top in range(0, canvas_size[1], band_height):
+                band_bottom = min(band_top + band_height, canvas_size[1])
+                band = Image.new(
+                    "RGB", (canvas_size[0], band_bottom - band_top), background
+                )
+                for path, (left, top) in zip(input_paths, corners):
+                    if top < band_bottom and top + cell_size[1] > band_top:
+                        paste_centered(
+                            band, path, (left, top - band_top), cell_size, thumbnail
+                        )
+                yield band.tobytes()
 
-    # Calculate the total width and height for the new image
-    total_width = imgs[0].size[0] * len(imgs)
-    total_height = imgs[0].size[1]
+        write_tiff_strips(output_path, canvas_size, band_height, bands())
+        print(f"Mosaic saved to {output_path}")
+        return
 
-    # Create a new blank image with the combined width and max height
-    mosaic = Image.new("RGB", (total_width, total_height))
+    # Create a new blank image to hold every cell
+    mosaic = Image.new("RGB", canvas_size, background)
 
-    # Paste the two images side by side
-    for index, img in enumerate(imgs):
-        mosaic.paste(img, (index * img.size[0], 0))
+    # Paste each image centered in its cell
+    for path, corner in zip(input_paths, corners):
+        paste_centered(mosaic, path, corner, cell_size, thumbnail)
 
     # Save the resulting mosaic image
     mosaic.save(output_path)
     print(f"Mosaic saved to {output_path}")
 
 
+def create_horizontal_mosaic(input_paths: list[Path], output_path: Path):
+    """Create a horizontal mosaic of two or more images."""
+    create_mosaic(input_paths, output_path)
+
+
+def parse_size(value: str) -> tuple[int, int]:
+    """Parse a WIDTHxHEIGHT (or a single SIZE for a square) argument."""
+    width, _, height = value.partition("x")
+    return int(width), int(height or width)
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("input", type=Path, nargs="+")
     parser.add_argument("--output", type=Path, required=True)
+    parser.add_argument(
+        "--columns", type=int, help="Number of columns (default: a single row)"
+    )
+    parser.add_argument(
+        "--padding", type=int, default=0, metavar="px", help="Space between cells"
+    )
+    parser.add_argument("--background", default="black", help="Background color")
+    parser.add_argument(
+        "--thumbnail",
+        type=parse_size,
+        metavar="WxH",
+        help="Shrink each image to fit within WxH pixels",
+    )
+    parser.add_argument(
+        "--out-of-core",
+        action="store_true",
+        help="Write the mosaic to a TIFF one band at a time, for very large mosaics",
+    )
+    parser.add_argument(
+        "--band-height",
+        type=int,
+        metavar="px",
+        help="Rows per band for --out-of-core (default: one row of cells)",
+    )
 
     args = parser.parse_args()
 
-    create_horizontal_mosaic(args.input, args.output)
+    create_mosaic(
+        args.input,
+        args.output,
+        columns=args.columns,
+        padding=args.padding,
+        background=args.background,
+        thumbnail=args.thumbnail,
+        out_of_core=args.out_of_core,
+        band_height=args.band_height,
+    )
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""Time the dodo.py pipeline with in-process and subprocess actions."""
+
+import argparse
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+DODO_FILE = Path(__file__).parent / "dodo.py"
+
+
+def write_synthetic_csv(datafile: Path, racers: int, laps: int = 30, seed: int = 0):
+    """Write random race results, with about one in twenty laps missing."""
+    rng = random.Random(seed)
+    with datafile.open(mode="w", encoding="utf-8") as outfile:
+        outfile.write(
+            ",".join(["name", "age", *(f"lap_{lap}" for lap in range(1, laps + 1))])
+            + "\n"
+        )
+        for racer in range(racers):
+            total = 0.0
+            lap_times = []
+            for lap in range(laps):
+                total += rng.uniform(30, 60)
+                # Never leave out the first or last lap, or two laps in a row
+                missing = 0 < lap < laps - 1 and rng.random() < 0.05
+                if missing and lap_times[-1]:
+                    lap_times.append("")
+                else:
+                    lap_times.append(f"{total:.2f}")
+            outfile.write(f"racer{racer},{rng.randint(16, 80)},{','.join(lap_times)}\n")
+
+
+def run_pipeline(datafile: Path, workdir: Path, actions: str, tasks: list[str]) -> float:
+    """Run the pipeline from scratch and return the elapsed time."""
+    workdir.mkdir(parents=True)
+    start = time.perf_counter()
+    subprocess.run(
+        [
+            sys.executable,
+            "-m",
+            "doit",
+            "--file",
+            DODO_FILE,
+            "--db-file",
+            workdir / ".doit.db",
+            f"csv={datafile}",
+            f"workdir={workdir}",
+            f"actions={actions}",
+            "renderer=local",
+            *tasks,
+        ],
+        check=True,
+        capture_output=True,
+    )
+    return time.perf_counter() - start
+
+
+def benchmark(racer_counts: list[int], tasks: list[str]):
+    """Compare both kinds of actions on synthetic CSVs of each size."""
+    print(f"Tasks: {' '.join(tasks)}")
+    print(f"{'racers':>8} {'inprocess (s)':>14} {'subprocess (s)':>15} {'speedup':>8}")
+
+    with tempfile.TemporaryDirectory() as tempdir:
+        for count in racer_counts:
+            datafile = Path(tempdir, f"racers-{count}.csv")
+            write_synthetic_csv(datafile, count)
+
+            times = {
+                actions: run_pipeline(
+                    datafile, Path(tempdir, f"{actions}-{count}"), actions, tasks
+                )
+                for actions in ("inprocess", "subprocess")
+            }
+            print(
+                f"{count:>8} {times['inprocess']:>14.2f} {times['subprocess']:>15.2f}"
+                f" {times['subprocess'] / times['inprocess']:>7.1f}x"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--racers", type=int, nargs="+", default=[100, 500, 1000], metavar="N"
+    )
+    parser.add_argument(
+        "--tasks",
+        nargs="+",
+        default=["extract", "merge"],
+        help="Tasks to run (plots are drawn locally, e.g. 'plot*')",
+    )
+    args = parser.parse_args()
+
+    benchmark(args.racers, args.tasks)
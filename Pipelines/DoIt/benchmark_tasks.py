@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""Time loading the dodo.py tasks with and without chunking, by racer count."""
+
+import argparse
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from benchmark_actions import DODO_FILE, write_synthetic_csv
+
+
+def time_doit(
+    datafile: Path, workdir: Path, chunk: int, command: str, *args: str
+) -> float:
+    """Run a doit command on the pipeline and return the elapsed time."""
+    start = time.perf_counter()
+    subprocess.run(
+        [
+            sys.executable,
+            "-m",
+            "doit",
+            command,
+            "--file",
+            DODO_FILE,
+            "--db-file",
+            workdir / ".doit.db",
+            f"csv={datafile}",
+            f"workdir={workdir}",
+            f"chunk={chunk}",
+            "renderer=local",
+            *args,
+        ],
+        check=True,
+        capture_output=True,
+    )
+    return time.perf_counter() - start
+
+
+def benchmark(racer_counts: list[int], chunk_sizes: list[int]):
+    """
+    Time `doit list` (loading the tasks) and `doit extract` twice: from
+    scratch, then again with every task up to date.
+    """
+    print(
+        f"{'racers':>8} {'chunk':>6} {'tasks':>7} {'list (s)':>9}"
+        f" {'extract (s)':>12} {'no-op (s)':>10}"
+    )
+
+    with tempfile.TemporaryDirectory() as tempdir:
+        for count in racer_counts:
+            datafile = Path(tempdir, f"racers-{count}.csv")
+            write_synthetic_csv(datafile, count)
+
+            for chunk in chunk_sizes:
+                workdir = Path(tempdir, f"{count}-{chunk}")
+                workdir.mkdir()
+
+                # Per racer: extract, _hashcheck and two plots; likewise per chunk
+                tasks = 4 * (count if chunk == 0 else -(-count // chunk))
+                listed = time_doit(datafile, workdir, chunk, "list")
+                extracted = time_doit(datafile, workdir, chunk, "run", "extract")
+                noop = time_doit(datafile, workdir, chunk, "run", "extract")
+                print(
+                    f"{count:>8} {chunk or '-':>6} {tasks:>7} {listed:>9.2f}"
+                    f" {extracted:>12.2f} {noop:>10.2f}"
+                )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--racers", type=int, nargs="+", default=[1_000, 5_000], metavar="N"
+    )
+    parser.add_argument(
+        "--chunks",
+        type=int,
+        nargs="+",
+        default=[0, 100, 1000],
+        metavar="N",
+        help="Chunk sizes to compare (0 makes tasks for each racer)",
+    )
+    args = parser.parse_args()
+
+    benchmark(args.racers, args.chunks)
@@ -1,7 +1,10 @@
 #!/usr/bin/env python3
 """DoIt dodo file."""
 
+import csv
+import os
 import subprocess
+import sys
 from functools import lru_cache
 from pathlib import Path
 
@@ -9,34 +12,174 @@ import doit
 from doit.action import CmdAction
 from doit.tools import result_dep
 
+# Settings can be overridden on the command line, e.g. `doit actions=subprocess`
+# (get_var returns None until doit has parsed the command line)
 SCRIPT_DIR = (Path(__file__).parent.parent / "scripts").resolve()
-CSV_FILE = (Path(__file__).parent.parent / "data/2021-02-18-data.csv").resolve()
-
-TEMP_DIR = (Path(__file__).parent / "temp").resolve()
-OUTPUT_DIR = (Path(__file__).parent / "output").resolve()
-
-
+CSV_FILE = Path(
+    doit.get_var("csv") or Path(__file__).parent.parent / "data/2021-02-18-data.csv"
+).resolve()
+
+WORK_DIR = Path(doit.get_var("workdir") or Path(__file__).parent).resolve()
+TEMP_DIR = WORK_DIR / "temp"
+OUTPUT_DIR = WORK_DIR / "output"
+
+# "inprocess" calls the scripts' functions, "subprocess" runs the scripts
+ACTIONS = doit.get_var("actions") or "inprocess"
+if ACTIONS not in ("inprocess", "subprocess"):
+    raise ValueError(f"Unknown actions '{ACTIONS}'!")
+
+# "image-charts" or "local" (see plot_data.py)
+RENDERER = doit.get_var("renderer") or "image-charts"
+
+# 0 makes tasks for each racer, N makes tasks for blocks of N racers
+CHUNK_SIZE = int(doit.get_var("chunk") or 0)
+if CHUNK_SIZE < 0:
+    raise ValueError(f"Invalid chunk size '{CHUNK_SIZE}'!")
+
+sys.path.insert(0, str(SCRIPT_DIR))
+from clean_racer_data import clean_data
+from extract_racer_data import extract_data, extract_racers
+from index_racer_data import file_hash
+from merge_racer_data import merge_data
+from plot_data import generate_line_plot, generate_plots
+from print_racer_names import racer_names
+
+# Run tasks on every core. In-process actions need separate processes to run
+# Python in parallel; subprocess actions only need threads to wait on them.
 DOIT_CONFIG = {
     "verbosity": 2,
     "default_tasks": ["plot*"],
+    "num_process": os.cpu_count() or 1,
+    "par_type": "process" if ACTIONS == "inprocess" else "thread",
 }
 
+# Task actions are module-level functions that are given every setting they
+# use, so that they can be pickled for `doit -P process` and behave the same
+# in worker processes that re-import this file with default settings.
+
 
 @lru_cache(maxsize=1)
 def get_racer_names() -> list[str]:
-    """Return a list of all of the racer names."""
+    """Return a list of all of the racer names (only used to create tasks)."""
+    if ACTIONS == "inprocess":
+        return racer_names(CSV_FILE)
+
     parse_script = SCRIPT_DIR / "print_racer_names.py"
     return (
         subprocess.check_output([parse_script, CSV_FILE]).decode("utf-8").splitlines()
     )
 
 
-def datahash(infile: Path):
-    """Return a dictionary with the hash of the input file's contents."""
+def datastat(infiles: list[Path]) -> dict:
+    """Return a dictionary with the input files' sizes and modification times."""
+    stats = {}
+    for infile in infiles:
+        stat = infile.stat()
+        stats[str(infile)] = [stat.st_size, stat.st_mtime_ns]
+    return {"stats": stats}
+
+
+def datahash(infiles: list[Path]) -> dict:
+    """Return a dictionary with the hash of the input files' contents."""
     # This is a bit of a cheat to help the "merged_racers" task - doit
     # struggles with dependencies for 'getargs'. Add in this task with a
-    # result that depends on the _contents_ of the clean file.
-    return {"hash": hash(infile.read_bytes())}
+    # result that depends on the _contents_ of the clean files. The digests
+    # must be stable between runs (unlike the salted built-in `hash`), or the
+    # merge would never be up to date.
+    return {"hash": {str(infile): file_hash(infile) for infile in infiles}}
+
+
+def unchanged_since_hashed(task, values: dict, infiles: list[Path]) -> bool:
+    """Check the sizes and modification times saved by `datastat` in the doit DB."""
+    try:
+        return datastat(infiles) == {"stats": values.get("stats")}
+    except FileNotFoundError:
+        return False
+
+
+def extract(csv_file: Path, racer_name: str, outfile: Path, actions: str) -> dict:
+    """Extract a single racer's data from the CSV file."""
+    if actions == "inprocess":
+        extract_data(csv_file, outfile, racer_name)
+    else:
+        subprocess.check_output([
+            SCRIPT_DIR / "extract_racer_data.py",
+            csv_file,
+            "--name",
+            racer_name,
+            outfile,
+        ])
+    return {"raw_data": str(outfile)}
+
+
+def qc(infile: Path, outfile: Path, actions: str) -> dict:
+    """Clean a single racer's data."""
+    if actions == "inprocess":
+        clean_data(infile, outfile)
+    else:
+        subprocess.check_output([SCRIPT_DIR / "clean_racer_data.py", infile, outfile])
+    return {"clean_data": str(outfile)}
+
+
+def extract_chunk(
+    csv_file: Path, racer_names: list[str], temp_dir: Path, actions: str
+) -> dict:
+    """Extract a block of racers in a single pass over the CSV, then clean them."""
+    raw_pattern = str(temp_dir / "raw-{name}.json")
+    if actions == "inprocess":
+        extract_racers(csv_file, raw_pattern, racer_names)
+    else:
+        subprocess.check_output([
+            SCRIPT_DIR / "extract_racer_data.py",
+            csv_file,
+            raw_pattern,
+            *(arg for racer_name in racer_names for arg in ("--name", racer_name)),
+        ])
+
+    clean_files = []
+    for racer_name in racer_names:
+        clean_files.append(temp_dir / f"clean-{racer_name}.json")
+        qc(Path(raw_pattern.format(name=racer_name)), clean_files[-1], actions)
+    return {"clean_data": [str(clean_file) for clean_file in clean_files]}
+
+
+def merge(outfile: Path, actions: str, racer_values: dict):
+    """Merge the cleaned data of every racer."""
+    # Each racer's task saved one file, each chunk's task a list of them
+    clean_files = []
+    for value in racer_values.values():
+        clean_files.extend([value] if isinstance(value, str) else value)
+
+    if actions == "inprocess":
+        merge_data([Path(clean_file) for clean_file in clean_files], outfile)
+    else:
+        subprocess.check_output(
+            [SCRIPT_DIR / "merge_racer_data.py", outfile, *clean_files]
+        )
+
+
+def plot_batch(
+    jobs: list[tuple[Path, Path, str]], jobsfile: Path, renderer: str, actions: str
+):
+    """Make a batch of plots in-process, or with `plot_data.py --batch`."""
+    if actions == "inprocess":
+        generate_plots(jobs, 800, 800, renderer)
+        return
+
+    with jobsfile.open(mode="w", newline="", encoding="utf-8") as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(["datafile", "outputfile", "type"])
+        writer.writerows(jobs)
+    try:
+        subprocess.check_output([
+            SCRIPT_DIR / "plot_data.py",
+            "--batch",
+            jobsfile,
+            "--renderer",
+            renderer,
+        ])
+    finally:
+        jobsfile.unlink()
 
 
 def task_mkdir():
@@ -45,7 +188,7 @@ def task_mkdir():
         yield {
             "name": path.name,
             "targets": [path],
-            "actions": [(path.mkdir, [], {"exist_ok": True})],
+            "actions": [(path.mkdir, [], {"exist_ok": True, "parents": True})],
             "uptodate": [path.exists],
             "clean": True,
         }
@@ -72,23 +215,13 @@ def task_single_racers():
         "doc": "Plot single-racer split times",
     }
 
+    if CHUNK_SIZE:
+        yield from racer_chunk_tasks(get_racer_names(), CHUNK_SIZE)
+        return
+
     extract_script = SCRIPT_DIR / "extract_racer_data.py"
     clean_script = SCRIPT_DIR / "clean_racer_data.py"
 
-    def extract(racer_name: str, outfile: Path):
-        subprocess.check_output([
-            extract_script,
-            CSV_FILE,
-            "--name",
-            racer_name,
-            outfile,
-        ])
-        return {"raw_data": str(outfile)}
-
-    def qc(infile: Path, outfile: Path):
-        subprocess.check_output([clean_script, infile, outfile])
-        return {"clean_data": str(outfile)}
-
     for racer_name in get_racer_names():
         racer_data = TEMP_DIR / f"raw-{racer_name}.json"
         clean_racer_data = TEMP_DIR / f"clean-{racer_name}.json"
@@ -100,8 +233,8 @@ def task_single_racers():
             "file_dep": [extract_script, clean_script, CSV_FILE],
             "targets": [racer_data, clean_racer_data],
             "actions": [
-                (extract, (racer_name, racer_data)),
-                (qc, (racer_data, clean_racer_data)),
+                (extract, (CSV_FILE, racer_name, racer_data, ACTIONS)),
+                (qc, (racer_data, clean_racer_data, ACTIONS)),
             ],
             "clean": True,
         }
@@ -109,26 +242,93 @@ def task_single_racers():
         yield {
             "basename": "_hashcheck",
             "name": racer_name,
-            "file_dep": [clean_racer_data],
+            "task_dep": [f"extract:{racer_name}"],
+            # Only rehash the file if it has been touched, and only rerun the
+            # merge if its contents changed. The result is the last action's.
+            "uptodate": [(unchanged_since_hashed, ([clean_racer_data],), {})],
             "actions": [
-                (datahash, (clean_racer_data,)),
+                (datastat, ([clean_racer_data],)),
+                (datahash, ([clean_racer_data],)),
             ],
         }
 
         yield from make_plots(clean_racer_data, racer_name)
 
 
+def racer_chunk_tasks(racer_names: list[str], chunk_size: int):
+    """
+    Yield the single-racer tasks for blocks of `chunk_size` racers at a time.
+
+    Each chunk still has a file for every racer, so only the chunks holding
+    changed racers are rebuilt.
+    """
+    extract_script = SCRIPT_DIR / "extract_racer_data.py"
+    clean_script = SCRIPT_DIR / "clean_racer_data.py"
+    plot_script = SCRIPT_DIR / "plot_data.py"
+
+    for start in range(0, len(racer_names), chunk_size):
+        chunk_names = racer_names[start : start + chunk_size]
+        chunk = f"chunk-{start // chunk_size:04d}"
+        raw_files = [TEMP_DIR / f"raw-{racer_name}.json" for racer_name in chunk_names]
+        clean_files = [
+            TEMP_DIR / f"clean-{racer_name}.json" for racer_name in chunk_names
+        ]
+
+        yield {
+            "basename": "extract",
+            "name": chunk,
+            "task_dep": ["mkdir:temp"],
+            "file_dep": [extract_script, clean_script, CSV_FILE],
+            "targets": raw_files + clean_files,
+            "actions": [(extract_chunk, (CSV_FILE, chunk_names, TEMP_DIR, ACTIONS))],
+            "clean": True,
+        }
+
+        yield {
+            "basename": "_hashcheck",
+            "name": chunk,
+            "task_dep": [f"extract:{chunk}"],
+            "uptodate": [(unchanged_since_hashed, (clean_files,), {})],
+            "actions": [
+                (datastat, (clean_files,)),
+                (datahash, (clean_files,)),
+            ],
+        }
+
+        for plot_type in ("lap", "split"):
+            jobs = [
+                (clean_file, OUTPUT_DIR / f"{plot_type}-{racer_name}.png", plot_type)
+                for racer_name, clean_file in zip(chunk_names, clean_files)
+            ]
+            yield {
+                "basename": f"plot-{plot_type}",
+                "name": chunk,
+                "actions": [
+                    (
+                        plot_batch,
+                        (
+                            jobs,
+                            TEMP_DIR / f"plots-{plot_type}-{chunk}.csv",
+                            RENDERER,
+                            ACTIONS,
+                        ),
+                    )
+                ],
+                "file_dep": [plot_script, *clean_files],
+                "task_dep": ["mkdir:output"],
+                "targets": [plot for _, plot, _ in jobs],
+                "clean": True,
+                "doc": f"Plot {plot_type} times for a block of racers",
+            }
+
+
 def task_merged_racers():
     """Yield tasks to handle the re-merged racers."""
-    merge_script = SCRIPT_DIR / "merge_racer_data.py"
     combined_data = TEMP_DIR / "merged.json"
 
-    def merge_data(racer_values):
-        subprocess.check_output([merge_script, combined_data, *racer_values.values()])
-
     yield {
         "basename": "merge",
-        "actions": [merge_data],
+        "actions": [(merge, (combined_data, ACTIONS))],
         "targets": [combined_data],
         "task_dep": ["mkdir:temp"],
         "getargs": {"racer_values": ("extract", "clean_data")},
@@ -144,6 +344,18 @@ def task_merged_racers():
         yield task
 
 
+def plot_action(datafile: Path, plot: Path, plot_type: str):
+    """Return an action that makes a plot, in-process or with plot_data.py."""
+    if ACTIONS == "inprocess":
+        return (generate_line_plot, (datafile, plot, 800, 800, plot_type, RENDERER))
+
+    plot_script = SCRIPT_DIR / "plot_data.py"
+    return CmdAction(
+        [plot_script, datafile, plot, "--type", plot_type, "--renderer", RENDERER],
+        shell=False,
+    )
+
+
 def make_plots(datafile: Path, name: str):
     """Yield tasks to make the plots."""
     plot_script = SCRIPT_DIR / "plot_data.py"
@@ -153,9 +365,7 @@ def make_plots(datafile: Path, name: str):
     yield {
         "basename": "plot-lap",
         "name": name,
-        "actions": [
-            CmdAction([plot_script, datafile, lap_plot, "--type", "lap"], shell=False),
-        ],
+        "actions": [plot_action(datafile, lap_plot, "lap")],
         "file_dep": [plot_script, datafile],
         "task_dep": ["mkdir:output"],
         "targets": [lap_plot],
@@ -166,11 +376,7 @@ def make_plots(datafile: Path, name: str):
     yield {
         "basename": "plot-split",
         "name": name,
-        "actions": [
-            CmdAction(
-                [plot_script, datafile, split_plot, "--type", "split"], shell=False
-            ),
-        ],
+        "actions": [plot_action(datafile, split_plot, "split")],
         "file_dep": [plot_script, datafile],
         "task_dep": ["mkdir:output"],
         "targets": [split_plot],
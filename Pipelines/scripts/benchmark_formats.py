@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""Benchmark saving and loading racer tables as CSV, JSON and .npz files."""
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+from racer_table import RacerTable, read_table, write_table
+
+
+def synthetic_table(racers: int, laps: int = 30, seed: int = 0) -> RacerTable:
+    """Return racers with random lap times, about 5% of them missing."""
+    rng = np.random.default_rng(seed)
+    lap_times = np.cumsum(rng.uniform(30, 60, size=(racers, laps)), axis=1).round(2)
+    lap_times[rng.random(lap_times.shape) < 0.05] = np.nan
+
+    return RacerTable(
+        names=np.array([f"racer{index:07d}" for index in range(racers)]),
+        ages=rng.integers(16, 80, size=racers),
+        laps=lap_times,
+    )
+
+
+def benchmark(racer_counts: list[int], suffixes: list[str]):
+    """Time writing and reading each format, checking that nothing is lost."""
+    print(
+        f"{'racers':>10} {'format':>6} {'size (MB)':>10} {'save (s)':>9}"
+        f" {'load (s)':>9} {'load (MB/s)':>11}"
+    )
+
+    with tempfile.TemporaryDirectory() as tempdir:
+        for count in racer_counts:
+            table = synthetic_table(count)
+            for suffix in suffixes:
+                path = Path(tempdir, f"racers{suffix}")
+
+                start = time.perf_counter()
+                write_table(table, path)
+                saved = time.perf_counter()
+                loaded = read_table(path)
+                done = time.perf_counter()
+
+                if not (
+                    np.array_equal(loaded.names, table.names)
+                    and np.array_equal(loaded.ages, table.ages)
+                    and np.array_equal(loaded.laps, table.laps, equal_nan=True)
+                ):
+                    raise RuntimeError(f"{suffix} round trip changed the data")
+
+                size_mb = path.stat().st_size / 2**20
+                print(
+                    f"{count:>10} {suffix:>6} {size_mb:>10.2f} {saved - start:>9.3f}"
+                    f" {done - saved:>9.3f} {size_mb / (done - saved):>11.1f}"
+                )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--racers", type=int, nargs="+", default=[1_000, 10_000, 100_000], metavar="N"
+    )
+    parser.add_argument(
+        "--formats", nargs="+", default=[".csv", ".json", ".npz"], metavar="EXT"
+    )
+    args = parser.parse_args()
+
+    benchmark(args.racers, args.formats)
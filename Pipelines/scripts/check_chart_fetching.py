@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""Check plot_data.py's chart fetching against a local stub HTTP server."""
+
+import argparse
+import json
+import os
+import tempfile
+import threading
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import plot_data
+
+PNG = b"\x89PNG\r\n\x1a\nstub chart"
+
+
+class StubChartHandler(BaseHTTPRequestHandler):
+    """Serve a fake PNG, after any failures queued for the requested path."""
+
+    # Keep connections open so that their reuse can be checked
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests.append(self.path)
+            server.clients.add(self.client_address)
+            queued = server.responses.get(self.path.split("?")[-1], [])
+            status = queued.pop(0) if queued else 200
+
+        body = PNG if status == 200 else b"stub error"
+        self.send_response(status)
+        if status == 429:
+            self.send_header("Retry-After", "0")
+        if status == 302:
+            self.send_header("Location", "/chart?redirected")
+        self.send_header("Content-Type", "image/png")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server() -> ThreadingHTTPServer:
+    """Start the stub server on a free local port."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubChartHandler)
+    server.lock = threading.Lock()
+    server.requests = []
+    server.clients = set()
+    # Statuses to send, in order, before succeeding for each query string
+    server.responses = {}
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def write_racers(datafile: Path, offset: float):
+    """Write two racers whose lap times depend on `offset`."""
+    racers = {
+        name: {"name": name, "age": 30, "laps": [offset + lap * 60 for lap in range(5)]}
+        for name in ("Alia", "Dylan")
+    }
+    datafile.write_text(json.dumps(racers), encoding="utf-8")
+
+
+def run_checks(server: ThreadingHTTPServer, tempdir: Path) -> list[tuple[str, bool]]:
+    """Return the name and outcome of each check."""
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    pool = plot_data.ConnectionPool(2)
+    results = []
+
+    def requests_for(query: str) -> int:
+        return sum(path.endswith(f"?{query}") for path in server.requests)
+
+    # Retries, through the pool and through urllib
+    server.responses["retry"] = [429, 503]
+    png, _ = plot_data.fetch_chart(f"{base}/chart?retry", pool, backoff=0.01)
+    results.append(
+        ("pool retries 429 and 503", png == PNG and requests_for("retry") == 3)
+    )
+
+    server.responses["single"] = [503]
+    png, _ = plot_data.fetch_chart(f"{base}/chart?single", None, backoff=0.01)
+    results.append(("urllib retries 503", png == PNG and requests_for("single") == 2))
+
+    server.responses["missing"] = [404]
+    try:
+        plot_data.fetch_chart(f"{base}/chart?missing", pool, backoff=0.01)
+        failed = False
+    except urllib.error.HTTPError as error:
+        failed = error.code == 404
+    results.append(("404 is not retried", failed and requests_for("missing") == 1))
+
+    server.responses["moved"] = [302]
+    png, _ = plot_data.fetch_chart(f"{base}/chart?moved", None, backoff=0.01)
+    results.append(
+        ("urllib follows redirects", png == PNG and requests_for("redirected") == 1)
+    )
+
+    # A batch with a duplicate chart, fetched over two connections and cached
+    plot_data.CHART_URL = f"{base}/chart"
+    jobs = []
+    for index in range(6):
+        datafile = tempdir / f"racers-{index}.json"
+        write_racers(datafile, offset=index % 5)
+        jobs.append((datafile, tempdir / f"plot-{index}.png", "lap"))
+
+    server.requests.clear()
+    server.clients.clear()
+    cache_dir = tempdir / "cache"
+    plot_data.generate_plots(jobs, 800, 800, workers=2, cache_dir=cache_dir)
+    results.append(
+        (
+            "batch fetches each distinct chart once",
+            len(server.requests) == len(set(server.requests)) == 5,
+        )
+    )
+    results.append(("batch reuses its connections", len(server.clients) <= 2))
+    results.append(
+        (
+            "batch writes every plot",
+            all(outputfile.read_bytes() == PNG for _, outputfile, _ in jobs),
+        )
+    )
+
+    server.requests.clear()
+    plot_data.generate_plots(jobs, 800, 800, workers=2, cache_dir=cache_dir)
+    results.append(("second batch comes from the cache", not server.requests))
+
+    # The stub also answers as a plain HTTP proxy for a made-up chart server
+    os.environ["http_proxy"] = base
+    os.environ.pop("no_proxy", None)
+    os.environ.pop("NO_PROXY", None)
+    # urlopen's default opener read the environment when it was first used
+    urllib.request.install_opener(urllib.request.build_opener())
+    server.requests.clear()
+    plot_data.fetch_chart("http://charts.invalid/chart?proxied", pool)
+    plot_data.fetch_chart("http://charts.invalid/chart?proxied", None)
+    results.append(
+        (
+            "pool and urllib use http_proxy",
+            server.requests == ["http://charts.invalid/chart?proxied"] * 2,
+        )
+    )
+
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.parse_args()
+
+    stub = start_server()
+    with tempfile.TemporaryDirectory() as tempdir:
+        checks = run_checks(stub, Path(tempdir))
+    stub.shutdown()
+
+    for name, passed in checks:
+        print(f"{'ok' if passed else 'FAIL':>4}  {name}")
+    raise SystemExit(0 if all(passed for _, passed in checks) else 1)
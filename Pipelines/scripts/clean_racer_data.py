@@ -3,15 +3,50 @@
 
 import argparse
 import json
+import math
 
 from pathlib import Path
 
+try:
+    import numpy as np
+    import racer_table
+except ImportError:  # NumPy isn't installed
+    np = racer_table = None
+
+# How to fill missing laps before the first or after the last recorded lap
+EXTRAPOLATION_MODES = ("none", "pace", "split")
+
+
+def clean_data(infile: Path, outfile: Path, extrapolate: str = "none"):
+    """
+    Interpolate any missing lap times for these racers.
+
+    With NumPy, any run of missing laps is filled (see `interpolate_laps`) and
+    laps whose total time doesn't increase are reported. Either file may then
+    be a .npz RacerTable instead of JSON, though a RacerTable only keeps each
+    racer's name, age and laps.
+    """
+    if ".npz" in (infile.suffix, outfile.suffix):
+        if racer_table is None:
+            raise ValueError("Reading and writing .npz files requires NumPy")
+
+        table = clean_table(racer_table.read_table(infile), extrapolate)
+        warn_nonmonotonic(table.names.tolist(), table.laps)
+        racer_table.write_table(table, outfile)
+        return
 
-def clean_data(infile: Path, outfile: Path):
-    """Interpolate any missing lap times for this racer."""
     with infile.open() as infileobj:
         racers = json.load(infileobj)
 
+    if np is not None:
+        clean_racers(racers, extrapolate)
+        with outfile.open(mode="w", encoding="utf-8") as outfileobj:
+            json.dump(racers, outfileobj, indent=2)
+        return
+
+    if extrapolate != "none":
+        raise ValueError("Extrapolating lap times requires NumPy")
+
     # This is cheating - I know that the first and last lap times will always
     # be defined and that there are never two empty laps in a row
     for racer in racers.values():
@@ -28,10 +63,128 @@ def clean_data(infile: Path, outfile: Path):
     with outfile.open(mode="w", encoding="utf-8") as outfileobj:
         json.dump(racers, outfileobj, indent=2)
 
+
+def interpolate_laps(laps: "np.ndarray", extrapolate: str = "none") -> "np.ndarray":
+    """
+    Fill missing (NaN) total lap times in a racers-by-laps matrix.
+
+    Runs of missing laps between two recorded laps are interpolated linearly.
+    Missing laps at the start and end are filled according to `extrapolate`:
+
+    * "none" leaves them missing.
+    * "pace" interpolates the first laps from the start (time 0) and extends
+      the last laps at the racer's average lap time.
+    * "split" interpolates the first laps from the start and extends the last
+      laps at the racer's last recorded split.
+
+    Racers without any recorded laps are left alone.
+    """
+    if extrapolate not in EXTRAPOLATION_MODES:
+        raise ValueError(f"Unknown extrapolation mode '{extrapolate}'!")
+
+    racers, total_laps = laps.shape
+    rows = np.arange(racers)[:, None]
+    columns = np.arange(total_laps)
+    recorded = ~np.isnan(laps)
+
+    # The index of the closest recorded lap at or before/after each lap
+    prior_index = np.maximum.accumulate(np.where(recorded, columns, -1), axis=1)
+    next_index = np.minimum.accumulate(
+        np.where(recorded, columns, total_laps)[:, ::-1], axis=1
+    )[:, ::-1]
+    prior_lap = laps[rows, np.maximum(prior_index, 0)]
+    next_lap = laps[rows, np.minimum(next_index, total_laps - 1)]
+
+    filled = laps.copy()
+    with np.errstate(invalid="ignore", divide="ignore"):
+        interior = ~recorded & (prior_index >= 0) & (next_index < total_laps)
+        fraction = (columns - prior_index) / (next_index - prior_index)
+        filled[interior] = (prior_lap + (next_lap - prior_lap) * fraction)[interior]
+
+        if extrapolate == "none":
+            return filled
+
+        # Lap "-1" finished at time 0, so leading gaps are interpolated from it
+        leading = ~recorded & (prior_index < 0) & (next_index < total_laps)
+        filled[leading] = (next_lap * (columns + 1) / (next_index + 1))[leading]
+
+        trailing = ~recorded & (prior_index >= 0) & (next_index >= total_laps)
+        if extrapolate == "pace":
+            split = prior_lap / (prior_index + 1)
+        else:
+            # The recorded lap before the last one, or the start
+            last = prior_index[:, -1:]
+            before = prior_index[rows, np.maximum(last - 1, 0)]
+            before = np.where(last > 0, before, -1)
+            before_lap = np.where(
+                before >= 0, laps[rows, np.maximum(before, 0)], 0.0
+            )
+            split = (laps[rows, np.maximum(last, 0)] - before_lap) / (last - before)
+        filled[trailing] = (prior_lap + (columns - prior_index) * split)[trailing]
+
+    return filled
+
+
+def nonmonotonic_laps(names: list[str], laps: "np.ndarray") -> list[tuple[str, int]]:
+    """Return each (racer name, lap number) whose total time doesn't increase."""
+    starts = np.zeros((len(names), 1))
+    splits = np.diff(np.concatenate([starts, laps], axis=1), axis=1)
+    racers, lap_numbers = np.nonzero(splits <= 0)
+    return [(names[racer], lap + 1) for racer, lap in zip(racers, lap_numbers)]
+
+
+def warn_nonmonotonic(names: list[str], laps: "np.ndarray"):
+    """Print a warning for each lap whose total time doesn't increase."""
+    for name, lap in nonmonotonic_laps(names, laps):
+        print(f"Warning: {name}'s time does not increase on lap {lap}")
+
+
+def clean_racers(racers: dict, extrapolate: str = "none") -> dict:
+    """
+    Interpolate missing lap times in the `{name: racer}` dictionaries in place.
+
+    Only missing laps are replaced, so every other field is kept. Racers are
+    interpolated together in groups with the same number of laps.
+    """
+    by_laps = {}
+    for racer in racers.values():
+        by_laps.setdefault(len(racer["laps"]), []).append(racer)
+
+    for total_laps, group in by_laps.items():
+        laps = np.array(
+            [[np.nan if lap is None else lap for lap in racer["laps"]] for racer in group],
+            dtype=np.float64,
+        ).reshape(len(group), total_laps)
+        filled = interpolate_laps(laps, extrapolate)
+        warn_nonmonotonic([racer["name"] for racer in group], filled)
+
+        for racer, row in zip(group, filled.tolist()):
+            racer["laps"] = [
+                row[index] if lap is None and not math.isnan(row[index]) else lap
+                for index, lap in enumerate(racer["laps"])
+            ]
+
+    return racers
+
+
+def clean_table(
+    table: "racer_table.RacerTable", extrapolate: str = "none"
+) -> "racer_table.RacerTable":
+    """Interpolate missing lap times for every racer in a RacerTable."""
+    return racer_table.RacerTable(
+        table.names, table.ages, interpolate_laps(table.laps, extrapolate)
+    )
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("infile", type=Path)
     parser.add_argument("outfile", type=Path)
+    parser.add_argument(
+        "--extrapolate",
+        choices=EXTRAPOLATION_MODES,
+        default="none",
+        help="How to fill missing laps at the start and end (requires NumPy)",
+    )
     args = parser.parse_args()
 
-    clean_data(args.infile, args.outfile)
+    clean_data(args.infile, args.outfile, args.extrapolate)
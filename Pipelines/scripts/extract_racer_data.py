@@ -1,23 +1,23 @@
 #!/usr/bin/env python3
-"""Extract a single racer's data and format it as JSON."""
+"""Extract a single racer's data (or many racers' data) and format it as JSON."""
 
 import argparse
 import csv
 import json
 
+from collections.abc import Iterable
 from pathlib import Path
 
+from index_racer_data import find_rows, load_index
+
+try:
+    import racer_table
+except ImportError:  # NumPy isn't installed
+    racer_table = None
 
-def extract_data(datafile: Path, outfile: Path, name: str):
-    """Print the racer identifiers."""
-    with datafile.open(newline="") as csvfile:
-        reader = csv.DictReader(csvfile)
-        for racer in reader:
-            if racer["name"] == name:
-                break
-        else:
-            raise ValueError(f"Racer {name} not found!")
 
+def parse_racer(racer: dict) -> dict:
+    """Convert a CSV row into a racer with an integer age and a list of laps."""
     racer["age"] = int(racer["age"])
     racer["laps"] = []
     for lap in range(1, 31):
@@ -27,16 +27,123 @@ def extract_data(datafile: Path, outfile: Path, name: str):
         except ValueError:
             racer["laps"].append(None)
 
+    return racer
+
+
+def write_racer(racer: dict, outfile: Path):
+    """Write a single racer's data as JSON, or as a RacerTable to .npz files."""
     racers = {racer["name"]: racer}
 
+    if outfile.suffix == ".npz":
+        if racer_table is None:
+            raise ValueError("Writing .npz files requires NumPy")
+        racer_table.write_npz(racer_table.RacerTable.from_racers(racers), outfile)
+        return
+
     with outfile.open(mode="w", encoding="utf-8") as outfileobj:
         json.dump(racers, outfileobj, indent=2)
 
+
+def extract_data(datafile: Path, outfile: Path, name: str):
+    """
+    Extract a single racer's data.
+
+    If the CSV has a valid index (see index_racer_data.py), the racer's row is
+    read directly instead of scanning the file.
+    """
+    index = load_index(datafile)
+    if index is not None:
+        _, racer = next(find_rows(datafile, [name], index))
+        if racer is None:
+            raise ValueError(f"Racer {name} not found!")
+        write_racer(parse_racer(racer), outfile)
+        return
+
+    with datafile.open(newline="") as csvfile:
+        reader = csv.DictReader(csvfile)
+        for racer in reader:
+            if racer["name"] == name:
+                break
+        else:
+            raise ValueError(f"Racer {name} not found!")
+
+    write_racer(parse_racer(racer), outfile)
+
+
+def extract_racers(
+    datafile: Path, outfile_pattern: str, names: Iterable[str] | None = None
+) -> dict[str, Path]:
+    """
+    Extract every racer (or only the given names) in a single pass over the CSV.
+
+    Each racer is written to `outfile_pattern` formatted with their name, e.g.
+    "temp/raw-{name}.json". Returns the file written for each racer.
+
+    Given names are read directly if the CSV has a valid index.
+    """
+    wanted = None if names is None else set(names)
+    outfiles = {}
+
+    index = None if wanted is None else load_index(datafile)
+    if index is not None:
+        missing = []
+        for name, racer in find_rows(datafile, sorted(wanted), index):
+            if racer is None:
+                missing.append(name)
+                continue
+            outfiles[name] = Path(outfile_pattern.format(name=name))
+            write_racer(parse_racer(racer), outfiles[name])
+
+        if missing:
+            raise ValueError(f"Racers {', '.join(missing)} not found!")
+        return outfiles
+
+    with datafile.open(newline="") as csvfile:
+        for racer in csv.DictReader(csvfile):
+            name = racer["name"]
+            # As with extract_data, only the first row for a name counts
+            if name in outfiles or (wanted is not None and name not in wanted):
+                continue
+
+            outfiles[name] = Path(outfile_pattern.format(name=name))
+            write_racer(parse_racer(racer), outfiles[name])
+
+            if wanted is not None and len(outfiles) == len(wanted):
+                break
+
+    if wanted is not None and (missing := wanted - outfiles.keys()):
+        raise ValueError(f"Racers {', '.join(sorted(missing))} not found!")
+
+    return outfiles
+
+
+def extract_table(
+    datafile: Path, names: Iterable[str] | None = None
+) -> "racer_table.RacerTable":
+    """Read every racer (or only the given names) into a columnar RacerTable."""
+    table = racer_table.read_csv(datafile)
+    return table if names is None else table.select(names)
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("datafile", type=Path)
-    parser.add_argument("outfile", type=Path)
-    parser.add_argument("--name", required=True, type=str)
+    parser.add_argument(
+        "outfile",
+        type=str,
+        help="Output file, or a pattern such as 'raw-{name}.json' for many racers",
+    )
+    selection = parser.add_mutually_exclusive_group(required=True)
+    selection.add_argument(
+        "--name", action="append", type=str, help="Racer to extract (repeatable)"
+    )
+    selection.add_argument(
+        "--all", action="store_true", help="Extract every racer in one pass"
+    )
     args = parser.parse_args()
 
-    extract_data(args.datafile, args.outfile, args.name)
+    if "{name}" in args.outfile:
+        extract_racers(args.datafile, args.outfile, None if args.all else args.name)
+    elif args.all or len(args.name) > 1:
+        parser.error("outfile must contain '{name}' to extract several racers")
+    else:
+        extract_data(args.datafile, Path(args.outfile), args.name[0])
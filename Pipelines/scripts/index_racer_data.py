@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""Build a sidecar index of where each racer's row starts in a data CSV."""
+
+import argparse
+import csv
+import hashlib
+import json
+from collections.abc import Iterable, Iterator
+from pathlib import Path
+
+INDEX_SUFFIX = ".idx.json"
+HASH_CHUNK_SIZE = 2**20
+
+
+def index_path(datafile: Path) -> Path:
+    """Return the sidecar index file for a data CSV."""
+    return datafile.with_name(datafile.name + INDEX_SUFFIX)
+
+
+def parse_line(line: bytes) -> list[str]:
+    """Parse a single CSV line."""
+    return next(csv.reader([line.decode("utf-8")]))
+
+
+def file_hash(datafile: Path) -> str:
+    """Return the blake2b digest of a file, read in chunks."""
+    digest = hashlib.blake2b()
+    with datafile.open(mode="rb") as infile:
+        while chunk := infile.read(HASH_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def build_index(datafile: Path) -> Path:
+    """
+    Index the byte offset of every racer's row, in file order.
+
+    The index also records the CSV's size, modification time and hash so that
+    a stale index is never used.
+    """
+    digest = hashlib.blake2b()
+    rows = []
+
+    with datafile.open(mode="rb") as infile:
+        header = infile.readline()
+        digest.update(header)
+        name_column = parse_line(header).index("name")
+
+        offset = len(header)
+        for line in infile:
+            digest.update(line)
+            if line.strip():
+                rows.append([parse_line(line)[name_column], offset])
+            offset += len(line)
+
+    stat = datafile.stat()
+    index = {
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "blake2b": digest.hexdigest(),
+        "rows": rows,
+    }
+
+    outfile = index_path(datafile)
+    with outfile.open(mode="w", encoding="utf-8") as outfileobj:
+        json.dump(index, outfileobj, separators=(",", ":"))
+    return outfile
+
+
+def load_index(datafile: Path) -> dict | None:
+    """
+    Return the index for a data CSV, or None if there isn't a valid one.
+
+    An index is valid if the CSV's size and modification time are unchanged,
+    or if its modification time changed but its contents did not.
+    """
+    try:
+        with index_path(datafile).open() as infile:
+            index = json.load(infile)
+    except (OSError, ValueError):
+        return None
+
+    stat = datafile.stat()
+    if stat.st_size != index["size"]:
+        return None
+
+    if stat.st_mtime_ns != index["mtime_ns"]:
+        if file_hash(datafile) != index["blake2b"]:
+            return None
+
+        # Still valid, so save rehashing the file next time
+        index["mtime_ns"] = stat.st_mtime_ns
+        try:
+            with index_path(datafile).open(mode="w", encoding="utf-8") as outfile:
+                json.dump(index, outfile, separators=(",", ":"))
+        except OSError:
+            pass
+
+    return index
+
+
+def find_rows(
+    datafile: Path, names: Iterable[str], index: dict
+) -> Iterator[tuple[str, dict | None]]:
+    """
+    Seek to each named racer's row, yielding it as a dict like csv.DictReader.
+
+    Racers that aren't in the index are yielded with None. As with a scan,
+    only the first row for each name is used.
+    """
+    offsets = {}
+    for name, offset in index["rows"]:
+        offsets.setdefault(name, offset)
+
+    with datafile.open(mode="rb") as infile:
+        header = parse_line(infile.readline())
+        for name in names:
+            if name not in offsets:
+                yield name, None
+                continue
+
+            infile.seek(offsets[name])
+            yield name, dict(zip(header, parse_line(infile.readline())))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("datafile", type=Path)
+    args = parser.parse_args()
+
+    print(f"Index saved to {build_index(args.datafile)}")
@@ -4,24 +4,189 @@
 import argparse
 import json
 
+from collections import deque
+from collections.abc import Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+try:
+    import racer_table
+except ImportError:  # NumPy isn't installed
+    racer_table = None
 
-def merge_data(datafiles: list[Path], outfile: Path):
-    """Print the racer identifiers."""
-    racers = {}
+# "indent" matches json.dump(..., indent=2); "jsonl" writes one racer per line
+OUTPUT_FORMATS = ("indent", "compact", "jsonl")
 
+
+def read_racers(datafile: Path) -> dict:
+    """Read racers from a JSON, JSON Lines (one racer per line) or .npz file."""
+    if datafile.suffix == ".npz":
+        if racer_table is None:
+            raise ValueError("Reading .npz files requires NumPy")
+        return racer_table.read_npz(datafile).to_racers()
+
+    with datafile.open() as infile:
+        if datafile.suffix != ".jsonl":
+            return json.load(infile)
+
+        racers = {}
+        for line in infile:
+            if line.strip():
+                racers.update(json.loads(line))
+        return racers
+
+
+def iter_inputs(datafiles: Iterable[Path], workers: int = 1) -> Iterator[dict]:
+    """
+    Read each input file, yielding their racers in order.
+
+    With more than one worker, files are read in a thread pool, at most two
+    files per worker ahead of the consumer. This only overlaps reading the
+    files from disk: parsing JSON holds the GIL, so the files are still parsed
+    one at a time.
+    """
+    if workers <= 1:
+        for datafile in datafiles:
+            yield read_racers(datafile)
+        return
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for datafile in datafiles:
+            pending.append(executor.submit(read_racers, datafile))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+
+        while pending:
+            yield pending.popleft().result()
+
+
+def merge_data(
+    datafiles: list[Path],
+    outfile: Path,
+    output_format: str | None = None,
+    workers: int = 1,
+    skip_duplicates: bool = False,
+):
+    """
+    Merge racers from several files into one, writing each racer as it is read.
+
+    Only one input is held in memory at a time, or up to two per worker when
+    `workers` prefetches them (see `iter_inputs`). A racer that
+    appears in more than one input is an error, unless `skip_duplicates` is set
+    to keep only their first appearance. The output format defaults to "jsonl"
+    for .jsonl files and "indent" otherwise.
+
+    A .npz output file is written as a single RacerTable once every input has
+    been read.
+    """
+    if outfile.suffix == ".npz":
+        merge_npz(datafiles, outfile, skip_duplicates)
+        return
+
+    if output_format is None:
+        output_format = "jsonl" if outfile.suffix == ".jsonl" else "indent"
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown output format '{output_format}'!")
+
+    seen = set()
+    separator = ""
+
+    try:
+        with outfile.open(mode="w", encoding="utf-8") as outfileobj:
+            if output_format != "jsonl":
+                outfileobj.write("{")
+
+            for racers in iter_inputs(datafiles, workers):
+                for name, racer in racers.items():
+                    if name in seen:
+                        if skip_duplicates:
+                            continue
+                        raise ValueError(
+                            f"Racer {name} appears in more than one input!"
+                        )
+                    seen.add(name)
+
+                    if output_format == "jsonl":
+                        outfileobj.write(
+                            json.dumps({name: racer}, separators=(",", ":")) + "\n"
+                        )
+                    elif output_format == "compact":
+                        outfileobj.write(
+                            separator
+                            + json.dumps({name: racer}, separators=(",", ":"))[1:-1]
+                        )
+                        separator = ","
+                    else:
+                        # Strip the braces (and their newlines) from each entry
+                        outfileobj.write(
+                            (separator or "\n")
+                            + json.dumps({name: racer}, indent=2)[2:-2]
+                        )
+                        separator = ",\n"
+
+            if output_format == "indent" and seen:
+                outfileobj.write("\n")
+            if output_format != "jsonl":
+                outfileobj.write("}")
+    except ValueError:
+        outfile.unlink(missing_ok=True)
+        raise
+
+
+def merge_npz(datafiles: list[Path], outfile: Path, skip_duplicates: bool = False):
+    """Merge racers from several files into a .npz RacerTable."""
+    if racer_table is None:
+        raise ValueError("Writing .npz files requires NumPy")
+
+    tables = []
     for datafile in datafiles:
-        with datafile.open() as infile:
-            racers.update(json.load(infile))
+        if datafile.suffix == ".npz":
+            tables.append(racer_table.read_npz(datafile))
+        else:
+            tables.append(racer_table.RacerTable.from_racers(read_racers(datafile)))
+
+    names = [name for table in tables for name in table.names.tolist()]
+    if not skip_duplicates and len(set(names)) < len(names):
+        raise ValueError("Some racers appear in more than one input!")
+
+    # Reversing makes concat keep each racer's first appearance
+    merged = racer_table.RacerTable.concat(tables[::-1])
+    racer_table.write_npz(merged.select(dict.fromkeys(names)), outfile)
 
 
-    with outfile.open(mode="w", encoding="utf-8") as outfileobj:
-        json.dump(racers, outfileobj, indent=2)
+def merge_tables(
+    tables: Iterable["racer_table.RacerTable"],
+) -> "racer_table.RacerTable":
+    """Merge RacerTables, later tables replacing racers of the same name."""
+    return racer_table.RacerTable.concat(tables)
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("outfile", type=Path)
     parser.add_argument("datafiles", type=Path, nargs="+")
+    parser.add_argument(
+        "--format",
+        choices=OUTPUT_FORMATS,
+        help="Output format (default: jsonl for .jsonl files, otherwise indent)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Prefetch inputs from disk in this many threads (parsing is not "
+        "parallel, and up to two inputs per thread are held in memory)",
+    )
+    parser.add_argument(
+        "--skip-duplicates",
+        action="store_true",
+        help="Keep the first of any duplicated racers instead of failing",
+    )
     args = parser.parse_args()
-    merge_data(args.datafiles, args.outfile)
+    merge_data(
+        args.datafiles,
+        args.outfile,
+        output_format=args.format,
+        workers=args.workers,
+        skip_duplicates=args.skip_duplicates,
+    )
@@ -2,23 +2,168 @@
 """Generate a line plot image from an input JSON file."""
 
 import argparse
+import base64
+import csv
+import hashlib
+import http.client
 import json
 import itertools
+import os
+import threading
+import time
+import urllib.error
 import urllib.parse
 import urllib.request
 
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 
+try:
+    import racer_table
+except ImportError:  # NumPy isn't installed
+    racer_table = None
 
-def get_lap_params(racers: dict) -> dict:
+try:
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+except ImportError:  # matplotlib isn't installed
+    Figure = None
+
+# "image-charts" fetches each plot from image-charts.com, "local" draws it here
+RENDERERS = ("image-charts", "local")
+CHART_URL = "https://image-charts.com/chart"
+
+# Responses worth retrying: rate limiting and server errors
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+DEFAULT_RETRIES = 4
+DEFAULT_BACKOFF = 1.0
+DEFAULT_WORKERS = 8
+
+
+class ConnectionPool:
+    """
+    Share at most `size` keep-alive HTTP(S) connections between threads.
+
+    Like urllib, requests go through the proxies in the `http_proxy`,
+    `https_proxy` and `no_proxy` environment variables. Redirects are not
+    followed.
+    """
+
+    def __init__(self, size: int = DEFAULT_WORKERS, timeout: float = 60):
+        self.timeout = timeout
+        self.slots = threading.BoundedSemaphore(size)
+        self.lock = threading.Lock()
+        self.idle = {}
+
+    def get(self, url: str) -> tuple[int, http.client.HTTPMessage, bytes]:
+        """Make a GET request, returning the status, headers and body."""
+        parts = urllib.parse.urlsplit(url)
+        key = (parts.scheme, parts.netloc)
+        target = urllib.parse.urlunsplit(("", "", parts.path, parts.query, ""))
+        proxy = proxy_for(parts)
+
+        headers = {}
+        if proxy is not None and parts.scheme == "http":
+            # Plain HTTP proxies take the full URL in each request
+            target = url
+            headers = proxy_headers(proxy)
+
+        with self.slots:
+            with self.lock:
+                connections = self.idle.setdefault(key, [])
+                connection = connections.pop() if connections else None
+
+            if connection is None:
+                connection = self.connect(parts, proxy)
+
+            try:
+                connection.request("GET", target, headers=headers)
+                response = connection.getresponse()
+                body = response.read()
+            except (OSError, http.client.HTTPException):
+                connection.close()
+                raise
+
+            if response.will_close:
+                connection.close()
+            else:
+                with self.lock:
+                    connections.append(connection)
+
+        return response.status, response.headers, body
+
+    def connect(
+        self, parts: urllib.parse.SplitResult, proxy: urllib.parse.SplitResult | None
+    ) -> http.client.HTTPConnection:
+        """Open a connection to the URL's server, or to its proxy."""
+        if parts.scheme == "https":
+            connection_class = http.client.HTTPSConnection
+        else:
+            connection_class = http.client.HTTPConnection
+
+        if proxy is None:
+            return connection_class(parts.netloc, timeout=self.timeout)
+
+        connection = connection_class(
+            proxy.hostname, proxy.port or 80, timeout=self.timeout
+        )
+        if parts.scheme == "https":
+            # Tunnel TLS to the server through the proxy
+            connection.set_tunnel(parts.netloc, headers=proxy_headers(proxy))
+        return connection
+
+
+def proxy_for(parts: urllib.parse.SplitResult) -> urllib.parse.SplitResult | None:
+    """Return the proxy that urllib would use for a URL, if any."""
+    proxy = urllib.request.getproxies().get(parts.scheme)
+    if not proxy or urllib.request.proxy_bypass(parts.hostname or ""):
+        return None
+    return urllib.parse.urlsplit(proxy if "://" in proxy else f"http://{proxy}")
+
+
+def proxy_headers(proxy: urllib.parse.SplitResult) -> dict:
+    """Return the Proxy-Authorization header for credentials in the proxy URL."""
+    if proxy.username is None:
+        return {}
+    credentials = ":".join(
+        urllib.parse.unquote(part or "") for part in (proxy.username, proxy.password)
+    )
+    token = base64.b64encode(credentials.encode("utf-8")).decode("ascii")
+    return {"Proxy-Authorization": f"Basic {token}"}
+
+
+def urlopen_get(url: str) -> tuple[int, http.client.HTTPMessage, bytes]:
+    """
+    Make a GET request with urllib, returning the status, headers and body.
+
+    Unlike `ConnectionPool.get`, this follows redirects.
+    """
+    try:
+        with urllib.request.urlopen(url) as response:
+            return response.status, response.headers, response.read()
+    except urllib.error.HTTPError as error:
+        return error.code, error.headers, error.read()
+
+
+def iter_laps(racers: "dict | racer_table.RacerTable") -> Iterator[tuple[str, list]]:
+    """Yield each racer's name and lap times from racer dicts or a RacerTable."""
+    if racer_table is not None and isinstance(racers, racer_table.RacerTable):
+        yield from zip(racers.names.tolist(), racers.laps.tolist())
+    else:
+        for racer_name, racer in racers.items():
+            yield racer_name, racer["laps"]
+
+
+def get_lap_params(racers: "dict | racer_table.RacerTable") -> dict:
     """Return the appropriate parameters for a line plot."""
 
     racer_names = []
     racer_laps = []
 
-    for racer_name, racer in racers.items():
+    for racer_name, laps in iter_laps(racers):
         racer_names.append(racer_name)
-        racer_laps.append(",".join(str(laptime) for laptime in [0, *racer["laps"]]))
+        racer_laps.append(",".join(str(laptime) for laptime in [0, *laps]))
 
     return {
         "chdl": "|".join(racer_names),
@@ -28,16 +173,16 @@ def get_lap_params(racers: dict) -> dict:
         "chm": "d,000000,0,-1,5.0", # Marker
     }
 
-def get_split_params(racers: dict) -> dict:
+def get_split_params(racers: "dict | racer_table.RacerTable") -> dict:
     """Return the appropriate parameters for a bar plot."""
     racer_names = []
     racer_splits = []
 
-    for racer_name, racer in racers.items():
+    for racer_name, laps in iter_laps(racers):
         racer_names.append(racer_name)
 
         split_times = []
-        for prior_lap, next_lap in itertools.pairwise(itertools.chain([0], racer["laps"])):
+        for prior_lap, next_lap in itertools.pairwise(itertools.chain([0], laps)):
             split_times.append(f"{next_lap-prior_lap:0.2f}")
 
         racer_splits.append(",".join(split_times))
@@ -50,14 +195,113 @@ def get_split_params(racers: dict) -> dict:
     }
 
 
-def generate_line_plot(datafile: Path, outputfile: Path, width: int, height: int, plot_type: str):
-    """Generates a PNG line plot using the Image Charts API and saves it to a file."""
-    # Extract x and y data
+def load_racers(datafile: Path) -> "dict | racer_table.RacerTable":
+    """Load racers from a JSON, JSON Lines (one racer per line) or .npz file."""
+    if datafile.suffix == ".npz":
+        if racer_table is None:
+            raise ValueError("Reading .npz files requires NumPy")
+        return racer_table.read_npz(datafile)
+
     with datafile.open(mode="rb") as infile:
-        data = json.load(infile)
+        if datafile.suffix != ".jsonl":
+            return json.load(infile)
+
+        racers = {}
+        for line in infile:
+            if line.strip():
+                racers.update(json.loads(line))
+        return racers
+
+
+def render_chart(params: dict, outputfile: Path):
+    """
+    Draw a PNG chart locally from Image Charts API parameters.
+
+    Only the parameters built by this script are supported: line charts
+    ("lc") and grouped bar charts ("bvg") of "a:" data, with a legend, title,
+    grid and markers.
+    """
+    if Figure is None:
+        raise ValueError("Rendering plots locally requires matplotlib")
+
+    width, height = (int(size) for size in params["chs"].split("x"))
+    names = params["chdl"].split("|")
+    series = [
+        [
+            float("nan") if value in ("", "None") else float(value)
+            for value in values.split(",")
+        ]
+        for values in params["chd"].removeprefix("a:").split("|")
+    ]
+
+    fig = Figure(figsize=(width / 100, height / 100), dpi=100)
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+
+    if params["cht"] == "lc":
+        for name, values in zip(names, series):
+            ax.plot(
+                range(len(values)),
+                values,
+                marker="D" if "chm" in params else None,
+                markersize=4,
+                label=name,
+            )
+    elif params["cht"] == "bvg":
+        bar_width = 0.8 / len(series)
+        for index, (name, values) in enumerate(zip(names, series)):
+            offset = (index - (len(series) - 1) / 2) * bar_width
+            ax.bar(
+                [lap + 1 + offset for lap in range(len(values))],
+                values,
+                width=bar_width,
+                label=name,
+            )
+    else:
+        raise ValueError(f"Unknown chart type '{params['cht']}'!")
+
+    ax.set_title(params.get("chtt", ""))
+    ax.grid("chg" in params)
+    ax.legend(fontsize="small")
+
+    fig.tight_layout()
+    fig.savefig(outputfile, format="png")
+    fig.clear()
+
+
+def generate_line_plot(
+    datafile: Path,
+    outputfile: Path,
+    width: int,
+    height: int,
+    plot_type: str,
+    renderer: str = "image-charts",
+    cache_dir: Path | None = None,
+):
+    """
+    Generates a PNG line plot and saves it to a file.
+
+    The plot comes from the Image Charts API (see `fetch_chart` for
+    `cache_dir`) unless `renderer` is "local", in which case it is drawn with
+    matplotlib from the same parameters.
+    """
+    params = get_plot_params(datafile, width, height, plot_type)
+
+    if renderer == "local":
+        render_chart(params, outputfile)
+        return
+    if renderer != "image-charts":
+        raise ValueError(f"Unknown renderer '{renderer}'!")
+
+    png, _ = fetch_chart(chart_url(params), None, cache_dir)
+    outputfile.write_bytes(png)
+
+
+def get_plot_params(datafile: Path, width: int, height: int, plot_type: str) -> dict:
+    """Return the Image Charts API parameters for a plot of the given file."""
+    # Extract x and y data
+    data = load_racers(datafile)
 
-    # Construct the Image Charts API URL
-    base_url = "https://image-charts.com/chart"
     params = {
         "chs": f"{width}x{height}",  # Chart size (width x height)
         "chxt": "x,y",  # Show axis
@@ -71,34 +315,181 @@ def generate_line_plot(datafile: Path, outputfile: Path, width: int, height: int
     else:
         raise ValueError(f"Unknown plot type '{plot_type}'!")
 
-    # Encode the parameters into the URL
-    url = f"{base_url}?{urllib.parse.urlencode(params)}"
+    return params
+
+
+def chart_url(params: dict) -> str:
+    """Encode the parameters into an Image Charts API URL."""
+    return f"{CHART_URL}?{urllib.parse.urlencode(params)}"
+
+
+def fetch_chart(
+    url: str,
+    pool: ConnectionPool | None,
+    cache_dir: Path | None = None,
+    retries: int = DEFAULT_RETRIES,
+    backoff: float = DEFAULT_BACKOFF,
+) -> tuple[bytes, bool]:
+    """
+    Fetch a chart, retrying rate-limited and failed requests with backoff.
+
+    Requests use the `pool`'s connections if given, and otherwise urllib.
+
+    If `cache_dir` is given, responses are stored there under a hash of the
+    full URL and an identical URL is never fetched again. Returns the PNG and
+    whether it came from the cache.
+    """
+    cached = None
+    if cache_dir is not None:
+        cached = cache_dir / f"{hashlib.blake2b(url.encode('utf-8')).hexdigest()}.png"
+        if cached.exists():
+            return cached.read_bytes(), True
+
+    for attempt in range(retries + 1):
+        delay = backoff * 2**attempt
+        try:
+            status, headers, body = (urlopen_get if pool is None else pool.get)(url)
+        except (OSError, http.client.HTTPException):
+            if attempt == retries:
+                raise
+        else:
+            if status == 200:
+                break
+            if status not in RETRY_STATUSES or attempt == retries:
+                raise urllib.error.HTTPError(
+                    url, status, f"Chart request failed ({status})", headers, None
+                )
+            # Honor the server's requested delay, if it gave one in seconds
+            retry_after = headers.get("Retry-After", "")
+            if retry_after.isdigit():
+                delay = max(delay, int(retry_after))
+
+        time.sleep(delay)
+
+    if cached is not None:
+        # Write then rename so that a partial file is never used
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        partial = cached.with_suffix(f".{os.getpid()}.{threading.get_ident()}.partial")
+        partial.write_bytes(body)
+        partial.replace(cached)
+
+    return body, False
 
-    # Make the HTTP request to fetch the PNG image
-    with urllib.request.urlopen(url) as response:
-        outputfile.write_bytes(response.read())
+
+def read_jobs(jobsfile: Path) -> list[tuple[Path, Path, str]]:
+    """
+    Read a CSV of plots with `datafile`, `outputfile` and `type` columns.
+
+    Relative paths are relative to the CSV file.
+    """
+    with jobsfile.open(newline="") as csvfile:
+        return [
+            (
+                jobsfile.parent / row["datafile"],
+                jobsfile.parent / row["outputfile"],
+                row["type"],
+            )
+            for row in csv.DictReader(csvfile)
+        ]
+
+
+def generate_plots(
+    jobs: list[tuple[Path, Path, str]],
+    width: int,
+    height: int,
+    renderer: str = "image-charts",
+    workers: int = DEFAULT_WORKERS,
+    cache_dir: Path | None = None,
+):
+    """
+    Generate many (datafile, outputfile, plot type) plots.
+
+    Remote charts are fetched concurrently over at most `workers` pooled
+    connections, and each distinct chart URL is only requested once.
+    """
+    if renderer == "local":
+        for datafile, outputfile, plot_type in jobs:
+            generate_line_plot(datafile, outputfile, width, height, plot_type, renderer)
+        return
+    if renderer != "image-charts":
+        raise ValueError(f"Unknown renderer '{renderer}'!")
+
+    outputs = {}
+    for datafile, outputfile, plot_type in jobs:
+        url = chart_url(get_plot_params(datafile, width, height, plot_type))
+        outputs.setdefault(url, []).append(outputfile)
+
+    pool = ConnectionPool(workers)
+    cache_hits = 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(fetch_chart, url, pool, cache_dir): url for url in outputs
+        }
+        for future in as_completed(futures):
+            png, cached = future.result()
+            cache_hits += cached
+            for outputfile in outputs[futures[future]]:
+                outputfile.write_bytes(png)
+
+    print(
+        f"{len(jobs)} plots: {len(outputs) - cache_hits} charts fetched, "
+        f"{cache_hits} from cache"
+    )
 
 # Example usage
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
-    parser.add_argument("datafile", type=Path)
-    parser.add_argument("outputfile", type=Path)
+    parser.add_argument("datafile", type=Path, nargs="?")
+    parser.add_argument("outputfile", type=Path, nargs="?")
     parser.add_argument("--width", type=int, default=800)
     parser.add_argument("--height", type=int, default=800)
 
     parser.add_argument(
         "--type",
-        required=True,
         choices=("lap", "split"),
     )
+    parser.add_argument(
+        "--renderer",
+        choices=RENDERERS,
+        default="image-charts",
+        help="Fetch the plot from image-charts.com or draw it locally with matplotlib",
+    )
+    parser.add_argument(
+        "--batch",
+        type=Path,
+        help="CSV file of plots (datafile,outputfile,type) to generate together",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=DEFAULT_WORKERS,
+        help="Concurrent chart requests for --batch",
+    )
+    parser.add_argument(
+        "--cache-dir", type=Path, help="Keep fetched charts here and reuse them"
+    )
 
     args = parser.parse_args()
 
-    # Generate the plot
-    generate_line_plot(
-        args.datafile,
-        args.outputfile,
-        args.width,
-        args.height,
-        args.type,
-    )
+    if args.batch is not None:
+        generate_plots(
+            read_jobs(args.batch),
+            args.width,
+            args.height,
+            args.renderer,
+            args.workers,
+            args.cache_dir,
+        )
+    elif args.datafile is None or args.outputfile is None or args.type is None:
+        parser.error("datafile, outputfile and --type are required without --batch")
+    else:
+        # Generate the plot
+        generate_line_plot(
+            args.datafile,
+            args.outputfile,
+            args.width,
+            args.height,
+            args.type,
+            args.renderer,
+            args.cache_dir,
+        )
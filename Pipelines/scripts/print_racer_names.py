@@ -6,13 +6,24 @@ import csv
 
 from pathlib import Path
 
+from index_racer_data import load_index
+
+
+def racer_names(datafile: Path) -> list[str]:
+    """Return the racer identifiers, from the CSV's index if it has a valid one."""
+    index = load_index(datafile)
+    if index is not None:
+        return [name for name, _ in index["rows"]]
 
-def print_identifiers(datafile: Path):
-    """Print the racer identifiers."""
     with datafile.open(newline="") as csvfile:
         reader = csv.DictReader(csvfile)
-        for row in reader:
-            print(row["name"])
+        return [row["name"] for row in reader]
+
+
+def print_identifiers(datafile: Path):
+    """Print the racer identifiers."""
+    for name in racer_names(datafile):
+        print(name)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,175 @@
+"""
+A columnar table of racers: names, ages and a matrix of lap times.
+
+Tables can be read from and written to the race results CSV, the scripts'
+`{name: racer}` JSON files and a compact binary .npz format, chosen by the
+file's extension.
+"""
+
+import csv
+import json
+from collections.abc import Iterable
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+
+
+@dataclass
+class RacerTable:
+    """
+    Racers stored column by column.
+
+    `laps` has one row per racer and one column per lap, holding the total time
+    at the end of each lap, with NaN for missing laps.
+    """
+
+    names: np.ndarray
+    ages: np.ndarray
+    laps: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    @classmethod
+    def from_racers(cls, racers: dict) -> "RacerTable":
+        """Build a table from the `{name: racer}` dictionaries the scripts use."""
+        return cls(
+            names=np.array([racer["name"] for racer in racers.values()], dtype=str),
+            ages=np.array([racer["age"] for racer in racers.values()], dtype=np.int64),
+            laps=np.array(
+                [
+                    [np.nan if lap is None else lap for lap in racer["laps"]]
+                    for racer in racers.values()
+                ],
+                dtype=np.float64,
+            ).reshape(len(racers), -1 if racers else 0),
+        )
+
+    def to_racers(self) -> dict:
+        """Return the `{name: racer}` dictionaries the scripts use."""
+        racers = {}
+        for name, age, laps in zip(self.names.tolist(), self.ages.tolist(), self.laps):
+            racers[name] = {
+                "name": name,
+                "age": age,
+                "laps": [None if np.isnan(lap) else lap for lap in laps.tolist()],
+            }
+        return racers
+
+    def select(self, names: Iterable[str]) -> "RacerTable":
+        """Return the named racers, in the given order."""
+        names = list(names)
+        index = {name: row for row, name in enumerate(self.names.tolist())}
+        missing = [name for name in names if name not in index]
+        if missing:
+            raise ValueError(f"Racers {', '.join(missing)} not found!")
+
+        rows = [index[name] for name in names]
+        return RacerTable(self.names[rows], self.ages[rows], self.laps[rows])
+
+    @classmethod
+    def concat(cls, tables: Iterable["RacerTable"]) -> "RacerTable":
+        """
+        Combine tables like `dict.update` would combine their racers.
+
+        A racer that appears in more than one table keeps the position of their
+        first appearance and the data of their last.
+        """
+        tables = list(tables)
+        names = np.concatenate([table.names for table in tables])
+        ages = np.concatenate([table.ages for table in tables])
+        laps = np.concatenate([table.laps for table in tables])
+
+        # The first and last row of each name
+        _, first = np.unique(names, return_index=True)
+        _, last = np.unique(names[::-1], return_index=True)
+        last = len(names) - 1 - last
+
+        order = np.argsort(first)
+        return cls(names[first[order]], ages[last[order]], laps[last[order]])
+
+
+def read_csv(datafile: Path) -> RacerTable:
+    """Read the race results CSV, with `name`, `age` and `lap_N` columns."""
+    with datafile.open(newline="") as csvfile:
+        reader = csv.reader(csvfile)
+        header = next(reader)
+        rows = list(reader)
+
+    lap_columns = [
+        header.index(f"lap_{lap}")
+        for lap in range(1, 1 + sum(column.startswith("lap_") for column in header))
+    ]
+    cells = np.array(rows, dtype=str).reshape(len(rows), len(header))
+    lap_cells = cells[:, lap_columns]
+
+    return RacerTable(
+        names=cells[:, header.index("name")],
+        ages=cells[:, header.index("age")].astype(np.int64),
+        laps=np.where(lap_cells == "", "nan", lap_cells).astype(np.float64),
+    )
+
+
+def write_csv(table: RacerTable, outfile: Path):
+    """Write the table in the shape of the race results CSV."""
+    with outfile.open(mode="w", newline="", encoding="utf-8") as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(
+            ["name", "age", *(f"lap_{lap}" for lap in range(1, table.laps.shape[1] + 1))]
+        )
+        for racer in table.to_racers().values():
+            writer.writerow(
+                [
+                    racer["name"],
+                    racer["age"],
+                    *("" if lap is None else lap for lap in racer["laps"]),
+                ]
+            )
+
+
+def read_json(datafile: Path) -> RacerTable:
+    """Read a `{name: racer}` JSON file written by one of the scripts."""
+    with datafile.open() as infile:
+        return RacerTable.from_racers(json.load(infile))
+
+
+def write_json(table: RacerTable, outfile: Path):
+    """Write the table as a `{name: racer}` JSON file."""
+    with outfile.open(mode="w", encoding="utf-8") as outfileobj:
+        json.dump(table.to_racers(), outfileobj, indent=2)
+
+
+def read_npz(datafile: Path) -> RacerTable:
+    """Read a table saved by `write_npz`."""
+    with np.load(datafile, allow_pickle=False) as arrays:
+        return RacerTable(arrays["names"], arrays["ages"], arrays["laps"])
+
+
+def write_npz(table: RacerTable, outfile: Path):
+    """Save the table's arrays, uncompressed, in a NumPy .npz file."""
+    # np.savez would add .npz to any other extension
+    with outfile.open(mode="wb") as outfileobj:
+        np.savez(outfileobj, names=table.names, ages=table.ages, laps=table.laps)
+
+
+READERS = {".csv": read_csv, ".json": read_json, ".npz": read_npz}
+WRITERS = {".csv": write_csv, ".json": write_json, ".npz": write_npz}
+
+
+def read_table(datafile: Path) -> RacerTable:
+    """Read a table from a .csv, .json or .npz file."""
+    try:
+        reader = READERS[datafile.suffix.lower()]
+    except KeyError:
+        raise ValueError(f"Unknown racer file type '{datafile.suffix}'!") from None
+    return reader(datafile)
+
+
+def write_table(table: RacerTable, outfile: Path):
+    """Write a table to a .csv, .json or .npz file."""
+    try:
+        writer = WRITERS[outfile.suffix.lower()]
+    except KeyError:
+        raise ValueError(f"Unknown racer file type '{outfile.suffix}'!") from None
+    writer(table, outfile)